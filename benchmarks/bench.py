@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Benchmark embed/extract over synthetic carriers.
+
+Generates PNG covers (RGB / RGBA / palette) and WAV covers (8-32 bit, mono
+to 8 channels) of the requested sizes, then runs embed_file / extract_file /
+embed_audio / extract_audio for each payload size that fits. Every
+operation runs in a fresh process so its peak RSS is its own, and the
+per-stage wall times from shadowbits.trace are kept with each result.
+Results are printed (or written with --output) as one JSON document:
+
+    python benchmarks/bench.py --preset quick --output results.json
+
+--threads runs every case once per thread count, so the multi-core gain of
+the threads option can be read off results that differ only in `threads`:
+
+    python benchmarks/bench.py --threads 1 4 --output threads.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+from shadowbits.capacity import image_capacity, audio_capacity
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+KEY = 'benchmark-key'
+MB = 1 << 20
+
+PRESETS = {
+    'quick': {
+        'megapixels': [0.1, 1],
+        'image_modes': ['RGB', 'RGBA', 'P'],
+        'sampwidths': [1, 2, 3, 4],
+        'channels': [1, 2],
+        'seconds': [10],
+        'payloads': [1 << 10, 64 << 10, 1 << 20],
+    },
+    'full': {
+        'megapixels': [0.1, 1, 5, 20, 50],
+        'image_modes': ['RGB', 'RGBA', 'P'],
+        'sampwidths': [1, 2, 3, 4],
+        'channels': [1, 2, 8],
+        'seconds': [10, 600, 3600],
+        'payloads': [1 << 10, 64 << 10, 1 << 20, 16 << 20],
+    },
+}
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (MB if sys.platform == 'darwin' else 1024), 1)
+
+
+def make_image(path, megapixels, mode, seed=0):
+    if os.path.exists(path):
+        return path
+    side = int((megapixels * 1e6) ** 0.5)
+    rng = np.random.default_rng(seed)
+    channels = 4 if mode == 'RGBA' else 3
+    img = Image.fromarray(rng.integers(0, 256, (side, side, channels), dtype=np.uint8))
+    if mode == 'P':
+        img = img.quantize(256)
+    img.save(path, format='PNG', compress_level=1)
+    return path
+
+
+def make_wav(path, sampwidth, channels, seconds, rate=44100, seed=0):
+    import wave
+    if os.path.exists(path):
+        return path
+    rng = np.random.default_rng(seed)
+    frames = int(seconds * rate)
+    block = rate * 10
+    with wave.open(path, 'wb') as fd:
+        fd.setnchannels(channels)
+        fd.setsampwidth(sampwidth)
+        fd.setframerate(rate)
+        for start in range(0, frames, block):
+            count = min(block, frames - start)
+            fd.writeframes(rng.integers(0, 256, count * channels * sampwidth, dtype=np.uint8).tobytes())
+    return path
+
+
+def make_payload(path, size, seed=1):
+    if not os.path.exists(path):
+        with open(path, 'wb') as f:
+            f.write(np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes())
+    return path
+
+
+def _run_operation(kind, action, cover, payload, output, threads=1):
+    ### Runs in a fresh worker process: import, time one operation, report its peak RSS
+    from shadowbits.emb_img import embed_file
+    from shadowbits.ext_img import extract_file
+    from shadowbits.emb_aud import embed_audio
+    from shadowbits.ext_aud import extract_audio
+
+    from shadowbits.trace import Tracer, use_tracer
+
+    stages = {}
+    def record(event):
+        if event['event'] == 'stage':
+            stages[event['path']] = stages.get(event['path'], 0) + event['seconds']
+
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+    with use_tracer(Tracer(callback=record, progress=False)):
+        if kind == 'img' and action == 'embed':
+            embed_file(cover, payload, KEY, output_path=output, threads=threads)
+        elif kind == 'img':
+            extract_file(cover, KEY, output_path=output, threads=threads)
+        elif action == 'embed':
+            embed_audio(cover, payload, KEY, output_path=output, threads=threads)
+        elif extract_audio(cover, KEY, output_path=output, threads=threads) is None:
+            raise ValueError(f"Extraction from {cover} failed")
+    return time.perf_counter() - start, baseline, _peak_rss_mb(), stages
+
+
+def run_operation(kind, action, cover, payload, output, threads=1):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(_run_operation, kind, action, cover, payload, output, threads).result()
+
+
+def cases(config, workdir):
+    for megapixels in config['megapixels']:
+        for mode in config['image_modes']:
+            cover = make_image(os.path.join(workdir, f"cover_{megapixels}mp_{mode}.png"), megapixels, mode)
+            yield 'img', cover, {'megapixels': megapixels, 'mode': mode}, image_capacity(cover)
+    for sampwidth in config['sampwidths']:
+        for channels in config['channels']:
+            for seconds in config['seconds']:
+                cover = make_wav(os.path.join(workdir, f"cover_{sampwidth * 8}bit_{channels}ch_{seconds}s.wav"),
+                                 sampwidth, channels, seconds)
+                yield 'aud', cover, {'sample_bits': sampwidth * 8, 'channels': channels, 'duration_s': seconds}, audio_capacity(cover)
+
+
+def run(config, workdir, thread_counts=(1,)):
+    results = []
+    for kind, cover, params, capacity in cases(config, workdir):
+        max_payload = capacity['modes'][0]['max_payload']
+        cover_mb = os.path.getsize(cover) / MB
+        for size in config['payloads']:
+            if size > max_payload:
+                continue
+            payload = make_payload(os.path.join(workdir, f"payload_{size}.bin"), size)
+            stego = os.path.join(workdir, 'stego.png' if kind == 'img' else 'stego.wav')
+            for threads in thread_counts:
+                for action in ('embed', 'extract'):
+                    if action == 'embed':
+                        seconds, baseline, peak, stages = run_operation(kind, action, cover, payload, stego, threads)
+                    else:
+                        seconds, baseline, peak, stages = run_operation(kind, action, stego, None, os.path.join(workdir, 'extracted.bin'), threads)
+                    result = dict(params, kind=kind, action=action, payload_bytes=size, threads=threads,
+                                  cover_mb=round(cover_mb, 2), seconds=round(seconds, 4),
+                                  payload_mb_s=round(size / MB / seconds, 3),
+                                  cover_mb_s=round(cover_mb / seconds, 3),
+                                  baseline_rss_mb=baseline, peak_rss_mb=peak,
+                                  stages={path: round(value, 4) for path, value in stages.items()})
+                    print(json.dumps(result), file=sys.stderr, flush=True)
+                    results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ShadowBits embed/extract on synthetic carriers')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick', help='Carrier and payload matrix to run')
+    parser.add_argument('--workdir', default=os.path.join('benchmarks', '.work'), help='Where generated covers are cached')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    parser.add_argument('--only', choices=['img', 'aud'], help='Only benchmark one carrier type')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1], metavar='N', help='Thread counts to run every case with')
+    args = parser.parse_args()
+
+    config = dict(PRESETS[args.preset])
+    if args.only == 'img':
+        config['sampwidths'] = []
+    elif args.only == 'aud':
+        config['megapixels'] = []
+    os.makedirs(args.workdir, exist_ok=True)
+
+    report = {
+        'preset': args.preset,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'results': run(config, args.workdir, args.threads),
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
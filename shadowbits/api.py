@@ -0,0 +1,512 @@
+"""
+In-memory embedding and extraction.
+
+Carriers can be given as raw bytes, a file-like object or a path, images
+also as a PIL Image or a uint8 ndarray, or as an already loaded carrier from
+carrier.py (embedding then works on it in place). Their format is detected
+by backends.py: PNG, BMP, TIFF or WebP images, WAV, AIFF or raw PCM audio.
+Each carrier is opened, decoded and validated exactly once. The path-based functions in emb_img /
+ext_img / emb_aud / ext_aud (and so the CLI) are thin wrappers around these.
+
+Payloads can be bytes or a binary file object. They are read, encrypted and
+embedded one segment at a time, so neither the payload, its ciphertext nor
+its bits are ever held in full. Compression (on by default, see compress.py)
+runs first into a spooled temporary file, which only spills to disk for
+large payloads.
+
+embed_entries hides several named files in one carrier behind an encrypted
+table of contents (see container.py). open_container reads only that table,
+and each entry is then extracted by decoding just its own bit positions.
+"""
+import io
+import itertools
+import os
+import tempfile
+from contextlib import ExitStack
+from . import trace
+from .backends import open_carrier
+from .compress import AUTO, CODEC_NONE, CODEC_NAMES, SAMPLE_SIZE, resolve_codec, compress_chunks, decompress_chunks
+from .crypto.aes import *
+from .container import Entry, pack_toc, parse_toc, check_names, find_entry
+from .header import pack_header, START_MARKER, END_MARKER, CONTENT_CONTAINER
+from .lsb import embed_stream, extract_stream, extract_bytes, read_header, read_salt, write_salt
+from .positions import KEYED, LEGACY
+from .validator import detect_file_type
+
+### Compressed payloads up to this size stay in memory; larger ones spill to a temporary file
+SPOOL_SIZE = 1 << 26
+
+
+def _save(write, output, message):
+    ### Write to `output` (path or file object), or return the encoded bytes when it is None
+    with trace.stage('save', message) as record:
+        if output is None:
+            buffer = io.BytesIO()
+            write(buffer)
+            result = buffer.getvalue()
+            record['bytes'] = len(result)
+            return result
+        write(output)
+        if isinstance(output, str) or hasattr(output, '__fspath__'):
+            record['bytes'] = os.path.getsize(output)
+        return output
+
+
+def _payload_source(payload, chunk_size=1 << SEGMENT_LOG):
+    ### (length, iterator of chunks) for bytes or a seekable binary file object
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        data = memoryview(payload)
+        return len(data), (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+    start = payload.tell()
+    payload.seek(0, io.SEEK_END)
+    length = payload.tell() - start
+    payload.seek(start)
+    return length, iter(lambda: payload.read(chunk_size), b'')
+
+
+def _sample(payload):
+    ### The first SAMPLE_SIZE bytes, leaving a file object where it was
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return payload[:SAMPLE_SIZE]
+    start = payload.tell()
+    sample = payload.read(SAMPLE_SIZE)
+    payload.seek(start)
+    return sample
+
+
+def _compress_payload(payload, compression, spool):
+    ### (codec, payload) where payload is either the original or `spool` holding the compressed bytes
+    sample = _sample(payload)
+    if not isinstance(payload, (bytes, bytearray, memoryview)):
+        start = payload.tell()
+
+    with trace.stage('choose_codec', nbytes=len(sample)):
+        codec = resolve_codec(compression, sample)
+    if codec == CODEC_NONE:
+        return codec, payload
+
+    length, chunks = _payload_source(payload)
+    with trace.stage('compress', f"Compressing the payload with {CODEC_NAMES[codec]}...", length):
+        for chunk in compress_chunks(codec, chunks):
+            spool.write(chunk)
+    if compression == AUTO and spool.tell() >= length:
+        # The sample compressed but the payload as a whole did not; store it as is
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            payload.seek(start)
+        return CODEC_NONE, payload
+    spool.seek(0)
+    return codec, spool
+
+
+def _embed_payload(carrier, layout, payload, key, scheme=KEYED, compression=AUTO, threads=1):
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as spool:
+        _embed_into(carrier, layout, payload, key, scheme, compression, spool, threads)
+
+
+def _embed_into(carrier, layout, payload, key, scheme, compression, spool, threads):
+    salt_layout = None
+    if scheme == LEGACY:
+        ### The original formats have no header to carry a codec and no salt, so they keep the
+        ### unsalted key, are never compressed and span the whole carrier
+        if not layout.is_default:
+            raise ValueError("Only the keyed scheme supports multi-bit and alpha/low-byte layouts")
+        layout = carrier.legacy_layout()
+        length, chunks = _payload_source(payload)
+        with trace.stage('encrypt', "Encrypting the payload bytes...", length):
+            payload = encryption(b''.join(chunks), key_password(key))
+        pieces = [START_MARKER, payload, END_MARKER]
+        if carrier.kind == 'img':
+            pieces.insert(1, len(payload).to_bytes(4, 'big'))
+        total = sum(len(piece) for piece in pieces)
+        seed = legacy_seed(key)
+    else:
+        salt_layout = carrier.salt_layout()
+        codec, payload = _compress_payload(payload, compression, spool)
+        length, chunks = _payload_source(payload)
+        with trace.stage('derive_key'):
+            context = embedding_context(key)
+        size = stream_ciphertext_size(length)
+        header = pack_header(size, AEAD_STREAM, SEGMENT_LOG, codec, layout.kind, layout.bits)
+        pieces = itertools.chain([header], encrypt_stream(chunks, context), [END_MARKER])
+        total = len(header) + size + len(END_MARKER)
+        seed = context.seed
+
+    trace.progress("Checking cover file capacity...")
+    if total * 8 > layout.n:
+        raise ValueError(f"Payload too large! Need {total * 8} bits but only have {layout.n} available")
+
+    with trace.stage('embed', "Encrypting and embedding the payload...", total):
+        if salt_layout is not None:
+            write_salt(carrier.buffer, salt_layout, context.salt)
+        embed_stream(carrier.buffer, layout.positions(scheme, seed), 0, pieces, threads)
+
+
+def _embed_entries(carrier, layout, entries, key, compression, stack, threads):
+    ### Every entry is compressed first, so the table of contents (written before them) knows their sizes
+    check_names([name for name, payload in entries])
+    salt_layout = carrier.salt_layout()
+    toc = []
+    sources = []
+    offset = 0
+    for name, payload in entries:
+        extension, mime_type = detect_file_type(bytes(_sample(payload)))
+        size, _ = _payload_source(payload)
+        spool = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE))
+        codec, payload = _compress_payload(payload, compression, spool)
+        length, chunks = _payload_source(payload)
+        toc.append(Entry(name, offset, stream_ciphertext_size(length), size, codec, extension, mime_type))
+        sources.append(chunks)
+        offset += toc[-1].length
+
+    with trace.stage('derive_key'):
+        context = embedding_context(key)
+    table = pack_toc(toc)
+    with trace.stage('encrypt_toc', nbytes=len(table)):
+        table = encryption(table, context)
+    header = pack_header(len(table), AEAD_EAX, SEGMENT_LOG, CODEC_NONE, layout.kind, layout.bits, CONTENT_CONTAINER)
+    streams = (encrypt_stream(chunks, context) for chunks in sources)
+    pieces = itertools.chain([header, table, END_MARKER], itertools.chain.from_iterable(streams))
+    total = len(header) + len(table) + len(END_MARKER) + offset
+
+    trace.progress("Checking cover file capacity...")
+    if total * 8 > layout.n:
+        raise ValueError(f"Files too large! Need {total * 8} bits but only have {layout.n} available")
+
+    with trace.stage('embed', f"Encrypting and embedding {len(toc)} file(s)...", total):
+        write_salt(carrier.buffer, salt_layout, context.salt)
+        embed_stream(carrier.buffer, layout.positions(KEYED, context.seed), 0, pieces, threads)
+
+
+def _check_end(buffer, positions, header):
+    ### Bit address where the header's ciphertext starts, once the end marker after it checks out
+    start_bit = header.size * 8
+    end_bit = start_bit + header.length * 8
+    if end_bit + len(END_MARKER) * 8 > positions.n:
+        raise ValueError(f"Not enough data to extract payload of length {header.length}")
+    if extract_bytes(buffer, positions.take(end_bit, len(END_MARKER) * 8)) != END_MARKER:
+        raise ValueError("End marker not found or corrupted")
+    return start_bit
+
+
+def _stream_chunks(buffer, positions, start_bit, length, segment_size, key, threads=1):
+    ### Decrypted chunks of the STREAM ciphertext of `length` bytes at bit address start_bit
+    prefix = extract_bytes(buffer, positions.take(start_bit, STREAM_PREFIX_SIZE * 8))
+    chunks = extract_stream(buffer, positions, start_bit + STREAM_PREFIX_SIZE * 8,
+                            length - STREAM_PREFIX_SIZE, segment_size + TAG_SIZE, threads)
+    return decrypt_stream(prefix, chunks, key, segment_size)
+
+
+def _decrypt_payload(buffer, positions, header, key, threads=1):
+    if header.content == CONTENT_CONTAINER:
+        raise ValueError("Stego file holds a container of several files - list them or extract them by name")
+    start_bit = _check_end(buffer, positions, header)
+
+    if header.aead == AEAD_EAX:
+        chunks = iter([decryption(extract_bytes(buffer, positions.take(start_bit, header.length * 8)), key)])
+    elif header.aead == AEAD_STREAM:
+        chunks = _stream_chunks(buffer, positions, start_bit, header.length, 1 << header.segment_log, key, threads)
+    else:
+        raise ValueError(f"Unsupported payload encryption {header.aead}")
+    return decompress_chunks(header.codec, chunks)
+
+
+def _legacy_image_payload(buffer, positions):
+    ### Unversioned image layout: start marker, 4-byte length, payload, end marker
+    head_bits = (len(START_MARKER) + 4) * 8
+    head = extract_bytes(buffer, positions.take(0, head_bits))
+    if not head.startswith(START_MARKER):
+        return None
+    length = int.from_bytes(head[len(START_MARKER):], 'big')
+    payload_end = head_bits + (length + len(END_MARKER)) * 8
+
+    if positions.n < payload_end:
+        raise ValueError(f"Not enough data to extract payload of length {length}")
+
+    with trace.stage('extract', "Extracting payload's bytes from stego file...", length):
+        data = extract_bytes(buffer, positions.take(head_bits, payload_end - head_bits))
+
+    trace.progress("Verifying the end marker in bytes...")
+    if data[length:] != END_MARKER:
+        raise ValueError(f"End marker not found or corrupted")
+    return data[:length]
+
+
+def _legacy_audio_payload(buffer, positions):
+    ### Unversioned audio layout has no length, so the whole carrier has to be decoded
+    if extract_bytes(buffer, positions.take(0, len(START_MARKER) * 8)) != START_MARKER:
+        return None
+
+    with trace.stage('extract', "Extracting the bits from stego file...", positions.n // 8):
+        extracted_bytes = extract_bytes(buffer, positions.take(0, positions.n))
+
+    trace.progress("Locating markers in bytes...")
+    search = len(START_MARKER)
+    end_byte = extracted_bytes.find(END_MARKER, search)
+    if end_byte == -1:
+        raise ValueError("Ending point not found - embedded data maybe corrupted")
+    return extracted_bytes[search:end_byte]
+
+
+def _find_header(buffer, layouts, seed):
+    ### (positions, header) of the keyed layout whose header names it, or None
+    with trace.stage('read_header', "Reading the header from stego file..."):
+        for layout in layouts:
+            positions = layout.positions(KEYED, seed)
+            header = read_header(buffer, positions)
+            if header is not None and (header.slots, header.bits) == (layout.kind, layout.bits):
+                return positions, header
+    return None
+
+
+def _key_context(carrier, key):
+    ### The salt sits in slots no payload uses, so it is read before the key and the positions exist
+    salt = read_salt(carrier.buffer, carrier.salt_layout())
+    with trace.stage('derive_key'):
+        return key_for_salt(key, salt)
+
+
+def _payload_chunks(carrier, key, scheme, legacy_reader, threads=1):
+    ### Locate the payload eagerly (so a wrong key fails here), then decrypt lazily
+    if scheme == LEGACY:
+        ### The old shuffle covers the whole carrier, so it is only tried when asked for
+        positions = carrier.legacy_layout().positions(LEGACY, legacy_seed(key))
+        payload = legacy_reader(carrier.buffer, positions)
+        if payload is not None:
+            with trace.stage('decrypt', nbytes=len(payload)):
+                return iter([decryption(payload, key_password(key))])
+        raise ValueError("Starting marker of the payload not found or key is incorrect")
+
+    context = _key_context(carrier, key)
+    found = _find_header(carrier.buffer, carrier.layouts(), context.seed)
+    if found is None:
+        raise ValueError("Header not found - key is incorrect, file holds no payload, "
+                         "or it was made by an older version (retry with the legacy scheme)")
+    return _decrypt_payload(carrier.buffer, *found, context, threads)
+
+
+def _counted(chunks, record):
+    record['bytes'] = 0
+    for chunk in chunks:
+        record['bytes'] += len(chunk)
+        yield chunk
+
+
+def _collect(chunks, output):
+    ### Decryption is lazy, so this stage is where extracted segments are actually decrypted
+    with trace.stage('decrypt') as record:
+        chunks = _counted(chunks, record)
+        if output is None:
+            return b''.join(chunks)
+        if isinstance(output, (str, bytes)) or hasattr(output, '__fspath__'):
+            try:
+                with open(output, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+            except Exception:
+                # A later segment failed to authenticate; don't leave a partial file behind
+                if os.path.exists(output):
+                    os.remove(output)
+                raise
+        else:
+            for chunk in chunks:
+                output.write(chunk)
+        return output
+
+
+@trace.traced('embed_image')
+def embed_image(cover, payload, key, scheme=KEYED, output=None, compression=AUTO, bits=1, alpha=False, png=None, threads=1):
+    """
+    Hide a payload (bytes or binary file object) in a cover image. Returns
+    the stego image as bytes, or writes it to `output` and returns that. It
+    keeps the cover's format (lossless for WebP), or is a PNG when the
+    cover is an array or in another format.
+    `compression` is 'auto' or one of the codec names in compress.CODECS.
+    `bits` low bits (1-4) of each channel are used, including alpha when
+    `alpha` is set and the cover has one. `png` is a carrier.PngOptions
+    for the output encoding. `threads` > 1 places bits on a thread pool,
+    with the same result.
+    """
+    trace.progress("Loading cover file...")
+    carrier = open_carrier(cover, 'img')
+
+    layout = carrier.layout(alpha, bits)
+    _embed_payload(carrier, layout, payload, key, scheme, compression=compression, threads=threads)
+
+    return _save(lambda out: carrier.save(out, png), output, "Saving the stego file...")
+
+
+def extract_image_chunks(stego, key, scheme=KEYED, threads=1):
+    """Locate the payload in a stego image and return an iterator of decrypted chunks."""
+    trace.progress("Loading stego file...")
+    carrier = open_carrier(stego, 'img')
+    return _payload_chunks(carrier, key, scheme, _legacy_image_payload, threads)
+
+
+@trace.traced('extract_image')
+def extract_image(stego, key, scheme=KEYED, output=None, threads=1):
+    """
+    Recover and decrypt the payload hidden in a stego image. Returns it as
+    bytes, or streams it to `output` (path or file object) and returns that.
+    """
+    return _collect(extract_image_chunks(stego, key, scheme, threads), output)
+
+
+@trace.traced('embed_audio')
+def embed_audio(cover, payload, key, scheme=KEYED, output=None, compression=AUTO, bits=1, low_byte=False, threads=1):
+    """
+    Hide a payload (bytes or binary file object) in a cover WAV, AIFF or
+    raw PCM file. Returns the stego file (same format) as bytes, or writes
+    it to `output` and returns that.
+    `compression` is 'auto' or one of the codec names in compress.CODECS.
+    `bits` low bits (1-4) of each byte are used, or of only the low byte of
+    each sample when `low_byte` is set. `threads` > 1 places bits on a
+    thread pool, with the same result. A carrier from
+    carrier.map_pcm(path, writable=True) is patched in place, and its path
+    is returned unless a different `output` is given.
+    """
+    trace.progress("Loading cover file...")
+    carrier = open_carrier(cover, 'aud', writable=True)
+
+    layout = carrier.layout(low_byte, bits)
+    _embed_payload(carrier, layout, payload, key, scheme, compression=compression, threads=threads)
+    return _save_audio(carrier, output)
+
+
+def _save_audio(carrier, output):
+    if carrier.mapped and (output is None or output == carrier.path):
+        with trace.stage('save', "Saving stego file...", len(carrier.buffer)):
+            carrier.buffer.flush()
+        return carrier.path
+
+    return _save(carrier.save, output, "Saving stego file...")
+
+
+def extract_audio_chunks(stego, key, scheme=KEYED, threads=1):
+    """Locate the payload in a stego audio file and return an iterator of decrypted chunks."""
+    trace.progress("Loading stego file...")
+    carrier = open_carrier(stego, 'aud')
+    return _payload_chunks(carrier, key, scheme, _legacy_audio_payload, threads)
+
+
+@trace.traced('extract_audio')
+def extract_audio(stego, key, scheme=KEYED, output=None, threads=1):
+    """
+    Recover and decrypt the payload hidden in a stego audio file. Returns it as
+    bytes, or streams it to `output` (path or file object) and returns that.
+    """
+    return _collect(extract_audio_chunks(stego, key, scheme, threads), output)
+
+
+def embed(cover, payload, key, scheme=KEYED, output=None, compression=AUTO, bits=1, alpha=False, low_byte=False, png=None, threads=1, format=None):
+    """
+    Hide a payload in a cover of any supported format, detected from its
+    content unless `format` names a backend. `alpha` and `png` only apply
+    to images, `low_byte` only to audio.
+    """
+    carrier = open_carrier(cover, writable=True, format=format)
+    if carrier.kind == 'img':
+        if low_byte:
+            raise ValueError("low_byte only applies to audio carriers")
+        return embed_image(carrier, payload, key, scheme, output, compression, bits, alpha, png, threads)
+    if alpha:
+        raise ValueError("alpha only applies to image carriers")
+    return embed_audio(carrier, payload, key, scheme, output, compression, bits, low_byte, threads)
+
+
+def extract_chunks(stego, key, scheme=KEYED, threads=1, format=None):
+    """Locate the payload in a stego file of any supported format and return an iterator of decrypted chunks."""
+    carrier = open_carrier(stego, format=format)
+    if carrier.kind == 'img':
+        return extract_image_chunks(carrier, key, scheme, threads)
+    return extract_audio_chunks(carrier, key, scheme, threads)
+
+
+def extract(stego, key, scheme=KEYED, output=None, threads=1, format=None):
+    """Like extract_image / extract_audio, for a stego file of any supported format."""
+    carrier = open_carrier(stego, format=format)
+    if carrier.kind == 'img':
+        return extract_image(carrier, key, scheme, output, threads)
+    return extract_audio(carrier, key, scheme, output, threads)
+
+
+@trace.traced('embed_entries')
+def embed_entries(cover, entries, key, output=None, compression=AUTO, bits=1, alpha=False, low_byte=False, png=None, threads=1, format=None):
+    """
+    Hide several files in one carrier of any supported format. `entries`
+    maps names to payloads (bytes or binary file objects), as a dict or a
+    sequence of (name, payload) pairs. Each is compressed and encrypted on
+    its own, and their names, sizes and types go into an encrypted table of
+    contents. Always uses the keyed scheme. Other options and the return
+    value are as for embed.
+    """
+    trace.progress("Loading cover file...")
+    carrier = open_carrier(cover, writable=True, format=format)
+    entries = list(entries.items()) if hasattr(entries, 'items') else list(entries)
+    if carrier.kind == 'img':
+        if low_byte:
+            raise ValueError("low_byte only applies to audio carriers")
+        layout = carrier.layout(alpha, bits)
+    else:
+        if alpha:
+            raise ValueError("alpha only applies to image carriers")
+        layout = carrier.layout(low_byte, bits)
+
+    with ExitStack() as stack:
+        _embed_entries(carrier, layout, entries, key, compression, stack, threads)
+
+    if carrier.kind == 'img':
+        return _save(lambda out: carrier.save(out, png), output, "Saving the stego file...")
+    return _save_audio(carrier, output)
+
+
+class Container:
+    """
+    The files of a container in a stego carrier. Opening it decodes only
+    the header and the table of contents; chunks(name) then reads and
+    decrypts just that entry's bit positions.
+    """
+
+    def __init__(self, buffer, positions, header, key, threads=1):
+        self.buffer = buffer
+        self.positions = positions
+        self.header = header
+        self.key = key
+        self.threads = threads
+        start_bit = _check_end(buffer, positions, header)
+        with trace.stage('read_toc', "Reading the table of contents...", header.length):
+            self.entries = parse_toc(decryption(extract_bytes(buffer, positions.take(start_bit, header.length * 8)), self.key))
+        self.data_bit = start_bit + (header.length + len(END_MARKER)) * 8
+
+    def chunks(self, name):
+        entry = find_entry(self.entries, name)
+        start_bit = self.data_bit + entry.offset * 8
+        if start_bit + entry.length * 8 > self.positions.n:
+            raise ValueError(f"Not enough data to extract {name}")
+        chunks = _stream_chunks(self.buffer, self.positions, start_bit, entry.length,
+                                1 << self.header.segment_log, self.key, self.threads)
+        return decompress_chunks(entry.codec, chunks)
+
+    def read(self, name):
+        return b''.join(self.chunks(name))
+
+
+def open_container(stego, key, threads=1, format=None):
+    """Locate the container in a stego file of any supported format and read its table of contents."""
+    trace.progress("Loading stego file...")
+    carrier = open_carrier(stego, format=format)
+    context = _key_context(carrier, key)
+    found = _find_header(carrier.buffer, carrier.layouts(), context.seed)
+    if found is None:
+        raise ValueError("Header not found - file may not contain embedded data or key is incorrect")
+    if found[1].content != CONTENT_CONTAINER:
+        raise ValueError("Stego file holds a single payload, not a container - extract it as a whole")
+    return Container(carrier.buffer, *found, context, threads)
+
+
+@trace.traced('extract_entry')
+def extract_entry(stego, key, name, output=None, threads=1, format=None):
+    """
+    Recover one file of a container by name. Returns it as bytes, or
+    streams it to `output` (path or file object) and returns that.
+    """
+    return _collect(open_container(stego, key, threads, format).chunks(name), output)
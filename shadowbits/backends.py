@@ -0,0 +1,209 @@
+"""
+Carrier formats. Each backend recognises its files from their first bytes
+(headerless PCM only by extension), loads them into a carrier from
+carrier.py and reads their size from the header alone. Every carrier
+exposes its sample bytes as one flat uint8 array (a memmap of the file for
+the PCM formats), so embedding and extraction are the same for all of them.
+"""
+import os
+import struct
+import sys
+from collections import namedtuple
+from functools import partial
+import numpy as np
+from .carrier import (_as_file, image_channels, load_image, load_wav, load_pcm, map_pcm, locate_pcm,
+                      ImageCarrier, WavCarrier)
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_COLOR_TYPES = (0, 2, 3, 4, 6)
+KIND_NAMES = {'img': 'image', 'aud': 'audio'}
+
+### name: format name as in Pillow / carrier.PCM_FORMATS; kind: 'img' or 'aud';
+### magic(head) tells from the first 16 bytes; load(source, writable), map(path, writable) (or None)
+### and info(source) -> header-only size tuple, as used by capacity.py: (width, height, channels)
+### for images, (frame bytes, sample width) for audio
+Backend = namedtuple('Backend', ['name', 'kind', 'extensions', 'magic', 'load', 'map', 'info'])
+
+BACKENDS = []
+
+
+def register_backend(backend):
+    ### Later registrations are tried first, so a plugin can take over a format
+    BACKENDS.insert(0, backend)
+    return backend
+
+
+def get_backend(name):
+    for backend in BACKENDS:
+        if backend.name == name.upper():
+            return backend
+    raise ValueError(f"Unknown carrier format {name}")
+
+
+def _open(carrier):
+    if isinstance(carrier, str) or hasattr(carrier, '__fspath__'):
+        return open(carrier, 'rb')
+    return _as_file(carrier)
+
+
+def _head(source, size=16):
+    f = _open(source)
+    try:
+        start = f.tell()
+        head = f.read(size)
+        f.seek(start)
+    finally:
+        if f is not source:
+            f.close()
+    return head
+
+
+def detect_backend(source, kind=None, format=None):
+    """
+    The backend for `source` (path, bytes or binary file object): `format`
+    if given, else the first whose magic matches, else by file extension.
+    """
+    if format:
+        backend = get_backend(format)
+        if kind and backend.kind != kind:
+            raise ValueError(f"{backend.name} is not an {KIND_NAMES[kind]} format")
+        return backend
+    candidates = [backend for backend in BACKENDS if kind in (None, backend.kind)]
+    try:
+        head = _head(source)
+    except OSError:
+        head = b''
+    for backend in candidates:
+        if backend.magic is not None and backend.magic(head):
+            return backend
+    if isinstance(source, str) or hasattr(source, '__fspath__'):
+        extension = os.path.splitext(os.fspath(source))[1].lower()
+        for backend in candidates:
+            if extension in backend.extensions:
+                return backend
+    kinds = KIND_NAMES[kind] if kind else 'carrier'
+    raise ValueError(f"Unsupported {kinds} format; supported: {', '.join(b.name for b in candidates)}")
+
+
+def _is_pil_image(source):
+    ### Without importing Pillow: if it isn't loaded, `source` can't be one of its images
+    module = sys.modules.get('PIL.Image')
+    return module is not None and isinstance(source, module.Image)
+
+
+def open_carrier(source, kind=None, writable=False, mmap=False, format=None):
+    """
+    Load `source` with the backend it is detected as. Carriers, PIL images
+    and arrays are taken as they are. With mmap=True a path is mapped when
+    its format allows it, and loaded otherwise.
+    """
+    if isinstance(source, (ImageCarrier, np.ndarray)) or _is_pil_image(source):
+        if kind == 'aud':
+            raise ValueError("Expected an audio carrier")
+        return load_image(source)
+    if isinstance(source, WavCarrier):
+        if kind == 'img':
+            raise ValueError("Expected an image carrier")
+        return load_wav(source, writable)
+
+    backend = detect_backend(source, kind, format)
+    if mmap and backend.map is not None and (isinstance(source, str) or hasattr(source, '__fspath__')):
+        try:
+            return backend.map(source, writable)
+        except ValueError:
+            pass
+    return backend.load(source, writable)
+
+
+def png_info(cover):
+    """(width, height, channels) of a PNG, where channels matches what ImageCarrier decodes to."""
+    f = _open(cover)
+    try:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError("not a PNG")
+        length, kind = struct.unpack('>I4s', f.read(8))
+        if kind != b'IHDR' or length != 13:
+            raise ValueError("missing IHDR")
+        width, height, depth, color_type = struct.unpack('>IIBB', f.read(10))
+        if width == 0 or height == 0 or color_type not in _PNG_COLOR_TYPES:
+            raise ValueError("bad IHDR")
+        f.seek(3 + 4, os.SEEK_CUR)
+
+        alpha = color_type in (4, 6)
+        while not alpha:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                raise ValueError("truncated PNG")
+            length, kind = struct.unpack('>I4s', chunk)
+            if kind in (b'IDAT', b'IEND'):
+                break
+            alpha = kind == b'tRNS'
+            f.seek(length + 4, os.SEEK_CUR)
+    except Exception:
+        raise ValueError("Carrier is not a valid PNG image file.")
+    finally:
+        if f is not cover:
+            f.close()
+    return width, height, 4 if alpha else 3
+
+
+def image_info(cover, format):
+    ### (width, height, channels) from Pillow's lazy open, which only parses the header
+    from PIL import Image
+    # Pillow leaves a file object it was handed open, so it is closed here
+    f = _open(cover)
+    try:
+        with Image.open(f) as img:
+            if img.format != format:
+                raise ValueError("unexpected format")
+            width, height = img.size
+            channels = image_channels(img)
+    except Exception:
+        raise ValueError(f"Carrier is not a valid {format} image file.")
+    finally:
+        if f is not cover:
+            f.close()
+    return width, height, channels
+
+
+def pcm_info(cover, format):
+    """(frame bytes, sample width) of a WAV, AIFF or raw PCM file, read from its header."""
+    f = _open(cover)
+    try:
+        start = f.tell()
+        f.seek(0, os.SEEK_END)
+        file_size = f.tell() - start
+        f.seek(start)
+        params = locate_pcm(f, format, file_size)[0]
+    except Exception:
+        raise ValueError(f"Carrier is not a valid {format} file.")
+    finally:
+        if f is not cover:
+            f.close()
+    return params.nframes * params.nchannels * params.sampwidth, params.sampwidth
+
+
+def _image_backend(name, extensions, magic, info=None):
+    info = info or partial(image_info, format=name)
+    return register_backend(Backend(name, 'img', extensions, magic,
+                                    lambda source, writable=False: load_image(source, (name,)), None, info))
+
+
+def _pcm_backend(name, extensions, magic, load=None):
+    load = load or (lambda source, writable=False: load_pcm(source, name, writable))
+    return register_backend(Backend(name, 'aud', extensions, magic, load,
+                                    lambda path, writable=False: map_pcm(path, name, writable),
+                                    partial(pcm_info, format=name)))
+
+
+# Raw PCM first so the formats with a signature take precedence
+for _width in (4, 3, 1):
+    _pcm_backend(f'PCM{_width * 8}', (), None)
+_pcm_backend('PCM16', ('.pcm', '.raw'), None)
+_pcm_backend('AIFF', ('.aif', '.aiff', '.aifc'), lambda head: head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'))
+_pcm_backend('WAV', ('.wav',), lambda head: head[:4] == b'RIFF' and head[8:12] == b'WAVE', load_wav)
+
+_image_backend('WEBP', ('.webp',), lambda head: head[:4] == b'RIFF' and head[8:12] == b'WEBP')
+_image_backend('TIFF', ('.tif', '.tiff'), lambda head: head[:4] in (b'II*\x00', b'MM\x00*'))
+_image_backend('BMP', ('.bmp',), lambda head: head[:2] == b'BM' and head[6:10] == b'\x00\x00\x00\x00')
+_image_backend('PNG', ('.png',), lambda head: head.startswith(PNG_SIGNATURE), png_info)
@@ -0,0 +1,85 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from .options import KEYED
+from .trace import Tracer, use_tracer
+
+MANIFEST_FIELDS = ('cover', 'payload', 'key', 'output', 'scheme')
+
+
+def load_manifest(manifest_path):
+    """
+    Read a batch manifest: JSON lines (.jsonl / .json) or CSV with a header row.
+    Every item needs cover, key and output; embed items also need payload.
+    Extract items may set scheme to 'legacy' for files made by older versions.
+    """
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Manifest {manifest_path} not found.")
+
+    with open(manifest_path, 'r', newline='') as f:
+        if manifest_path.lower().endswith(('.jsonl', '.json')):
+            items = [json.loads(line) for line in f if line.strip()]
+        else:
+            items = list(csv.DictReader(f))
+
+    return [{field: item.get(field) for field in MANIFEST_FIELDS} for item in items]
+
+
+@lru_cache(maxsize=64)
+def _embedding_context(password):
+    ### One salt per key per worker, so items that share a key pay for the KDF once. The salt
+    ### sits in plain in each carrier, so it links every output that reuses it
+    from .crypto.aes import KeyContext
+    return KeyContext.new(password)
+
+
+def _run_item(kind, action, index, item, reuse_salt=False):
+    ### Runs in a worker process; the embed/extract modules stay imported between items
+    start = time.time()
+    result = {'index': index, 'cover': item.get('cover'), 'output': item.get('output'), 'ok': False, 'error': None}
+    try:
+        for field in ('cover', 'key', 'output') + (('payload',) if action == 'embed' else ()):
+            if not item.get(field):
+                raise ValueError(f"Manifest item is missing '{field}'")
+
+        key = _embedding_context(item['key']) if action == 'embed' and reuse_salt else item['key']
+        with use_tracer(Tracer(progress=False)):
+            if kind == 'img' and action == 'embed':
+                from .emb_img import embed_file
+                embed_file(item['cover'], item['payload'], key, output_path=item['output'])
+            elif kind == 'img' and action == 'extract':
+                from .ext_img import extract_file
+                extract_file(item['cover'], item['key'], item.get('scheme') or KEYED, output_path=item['output'])
+            elif kind == 'aud' and action == 'embed':
+                from .emb_aud import embed_audio
+                embed_audio(item['cover'], item['payload'], key, output_path=item['output'])
+            elif kind == 'aud' and action == 'extract':
+                from .ext_aud import extract_audio
+                if extract_audio(item['cover'], item['key'], item.get('scheme') or KEYED, output_path=item['output']) is None:
+                    raise ValueError(f"No hidden file could be extracted from {item['cover']}")
+            else:
+                raise ValueError(f"Unknown batch operation {kind} {action}")
+
+        result['ok'] = True
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+
+    result['seconds'] = round(time.time() - start, 3)
+    return result
+
+
+def run_batch(items, kind, action='embed', workers=None, reuse_salt=False):
+    """
+    Fan manifest items out over a process pool and yield one result dict per
+    item as it finishes. A failing item is reported with ok=False and the
+    batch carries on with the rest. With `reuse_salt`, embed items that share
+    a key reuse one salt per worker and so run scrypt once, but their
+    outputs then carry the same salt bits.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_run_item, kind, action, index, item, reuse_salt) for index, item in enumerate(items)]
+        for future in as_completed(futures):
+            yield future.result()
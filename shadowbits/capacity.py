@@ -0,0 +1,95 @@
+"""
+Capacity planning from container headers alone: the PNG signature and
+chunk headers up to the first IDAT, the header Pillow parses for the other
+image formats, or the WAV / AIFF chunk headers. No pixel or frame data is
+decoded, so a directory of covers can be sized cheaply.
+"""
+import os
+from .backends import detect_backend
+from .carrier import image_layouts, wav_layouts
+from .header import (HEADER_SIZE, MAX_LENGTH, END_MARKER, STREAM_PREFIX_SIZE, TAG_SIZE, SEGMENT_LOG,
+                     stream_ciphertext_size)
+from .positions import SLOTS_DEFAULT, SLOTS_ALPHA, SLOTS_LOW_BYTE
+
+MODE_NAMES = {SLOTS_DEFAULT: 'default', SLOTS_ALPHA: 'alpha', SLOTS_LOW_BYTE: 'low-byte'}
+
+### Bytes around the payload: header, stream nonce prefix and end marker
+OVERHEAD = HEADER_SIZE + STREAM_PREFIX_SIZE + len(END_MARKER)
+
+
+def max_payload(capacity_bits, segment_size=1 << SEGMENT_LOG):
+    ### Largest payload (after compression) whose embedded form fits in capacity_bits
+    ### and whose ciphertext length the header can record
+    available = min(capacity_bits // 8 - OVERHEAD, MAX_LENGTH - STREAM_PREFIX_SIZE)
+    if available < TAG_SIZE:
+        return 0
+    segments, rest = divmod(available, segment_size + TAG_SIZE)
+    return segments * segment_size + max(0, rest - TAG_SIZE)
+
+
+def required_bits(payload_size):
+    return (HEADER_SIZE + stream_ciphertext_size(payload_size) + len(END_MARKER)) * 8
+
+
+def _modes(layouts):
+    return [{
+        'mode': MODE_NAMES[layout.kind],
+        'bits': layout.bits,
+        'capacity_bits': layout.n,
+        'max_payload': max_payload(layout.n),
+    } for layout in layouts]
+
+
+def image_capacity(cover, format=None):
+    """
+    Usable capacity of a cover image for every embedding mode, without
+    decoding it. max_payload is the largest payload that fits once
+    encryption and marker overhead are added.
+    """
+    backend = detect_backend(cover, 'img', format)
+    width, height, channels = backend.info(cover)
+    return {
+        'format': backend.name,
+        'width': width,
+        'height': height,
+        'channels': channels,
+        'modes': _modes(image_layouts(width * height * channels, channels)),
+    }
+
+
+def audio_capacity(cover, format=None):
+    """Usable capacity of a cover audio file for every embedding mode, read from its header."""
+    backend = detect_backend(cover, 'aud', format)
+    frame_bytes, sampwidth = backend.info(cover)
+    return {
+        'format': backend.name,
+        'frame_bytes': frame_bytes,
+        'sampwidth': sampwidth,
+        'modes': _modes(wav_layouts(frame_bytes, sampwidth)),
+    }
+
+
+def select_cover(directory, payload_size, kind, mode='default', bits=1):
+    """
+    Pick the cover in `directory` with the least capacity that still fits
+    a payload of `payload_size` bytes in the given mode. Returns
+    (path, mode info) or None. Files that are not valid covers are skipped.
+    payload_size is taken as is, so auto compression can only add headroom.
+    """
+    capacity = image_capacity if kind == 'img' else audio_capacity
+    needed = required_bits(payload_size)
+    best = None
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        try:
+            info = capacity(path)
+        except ValueError:
+            continue
+        for entry in info['modes']:
+            if (entry['mode'], entry['bits']) != (mode, bits) or entry['capacity_bits'] < needed:
+                continue
+            if best is None or entry['capacity_bits'] < best[1]['capacity_bits']:
+                best = (path, entry)
+    return best
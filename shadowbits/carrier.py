@@ -0,0 +1,470 @@
+"""
+Loaded carriers. Each loader opens and decodes the carrier once, validates
+the decoded result, and hands back an object that the rest of the pipeline
+works on, so no file is read twice.
+"""
+import io
+import os
+import struct
+import wave
+from collections import namedtuple
+import numpy as np
+from . import trace
+from .header import SALT_BITS
+from .options import PNG_MODES, PNG_STRATEGIES
+from .positions import SlotLayout, SLOTS_DEFAULT, SLOTS_ALPHA, SLOTS_LOW_BYTE, MAX_BITS
+
+
+def _as_file(carrier):
+    if isinstance(carrier, (bytes, bytearray, memoryview)):
+        return io.BytesIO(carrier)
+    return carrier
+
+
+def _salt_bytes(width, stride):
+    ### Buffer bytes at the end of the carrier set aside for the salt
+    return -(-SALT_BITS // width) * stride
+
+
+def _salt_layout(buffer_size, width, stride, offset=0):
+    ### The salt goes in order into plane 0 of the last slots, at positions that do not depend
+    ### on the password, since the key is derived from it
+    reserved = _salt_bytes(width, stride)
+    if buffer_size < reserved:
+        raise ValueError("Carrier is too small to hold a payload")
+    return SlotLayout(reserved, SLOTS_DEFAULT, 1, width, stride, buffer_size - reserved + offset)
+
+
+def image_salt_layout(buffer_size, channels):
+    return _salt_layout(buffer_size, 3, channels)
+
+
+def image_layout(buffer_size, channels, alpha=False, bits=1):
+    buffer_size = max(0, buffer_size - _salt_bytes(3, channels))
+    if alpha:
+        if channels != 4:
+            raise ValueError("Cover image has no alpha channel")
+        return SlotLayout(buffer_size, SLOTS_ALPHA, bits, 4, 4)
+    return SlotLayout(buffer_size, SLOTS_DEFAULT, bits, 3, channels)
+
+
+def image_layouts(buffer_size, channels):
+    ### Every layout a payload may have been embedded with, most common first
+    alphas = (False, True) if channels == 4 else (False,)
+    return [image_layout(buffer_size, channels, alpha, bits) for alpha in alphas for bits in range(1, MAX_BITS + 1)]
+
+
+def wav_salt_layout(buffer_size, sampwidth, big_endian=False):
+    return _salt_layout(buffer_size, 1, sampwidth, sampwidth - 1 if big_endian else 0)
+
+
+def wav_layout(buffer_size, sampwidth, low_byte=False, bits=1, big_endian=False):
+    buffer_size = max(0, buffer_size - _salt_bytes(1, sampwidth))
+    if low_byte:
+        # WAV samples are little-endian, so the low byte comes first; in AIFF it comes last
+        return SlotLayout(buffer_size, SLOTS_LOW_BYTE, bits, 1, sampwidth, sampwidth - 1 if big_endian else 0)
+    return SlotLayout(buffer_size, SLOTS_DEFAULT, bits)
+
+
+def wav_layouts(buffer_size, sampwidth, big_endian=False):
+    return [wav_layout(buffer_size, sampwidth, low_byte, bits, big_endian) for low_byte in (False, True) for bits in range(1, MAX_BITS + 1)]
+
+
+### PNG output: a preset from PNG_MODES, optional zlib level/strategy overrides and
+### whether to copy the cover's ancillary chunks (text, iCCP, pHYs, gAMA, sRGB)
+PngOptions = namedtuple('PngOptions', ['mode', 'compress_level', 'strategy', 'preserve'],
+                        defaults=('default', None, None, False))
+
+
+### Lossless image formats a stego image can be written back in
+IMAGE_FORMATS = ('PNG', 'BMP', 'TIFF', 'WEBP')
+_TIFF_LOSSLESS = ('raw', 'tiff_lzw', 'tiff_deflate', 'tiff_adobe_deflate', 'packbits')
+
+
+def image_channels(img):
+    ### Channels ImageCarrier decodes `img` to: images with transparency keep their alpha
+    return 4 if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info else 3
+
+
+class ImageCarrier:
+    """
+    A decoded image: size, original mode and a flat r, g, b(, a) channel
+    buffer. Images with transparency keep their alpha channel.
+    """
+    kind = 'img'
+
+    def __init__(self, img):
+        self.format = img.format
+        self.mode = img.mode
+        self.width, self.height = img.size
+        if getattr(img, 'n_frames', 1) > 1:
+            raise ValueError("Multi-frame images are not supported")
+        # Ancillary chunks, kept so the output can match the cover
+        self.text = dict(getattr(img, 'text', None) or {})
+        self.info = {key: img.info[key] for key in ('icc_profile', 'dpi', 'gamma', 'srgb', 'compression') if key in img.info}
+        self.channels = image_channels(img)
+        if self.channels == 4 and self.format == 'BMP':
+            # Pillow writes 32-bit BMPs without an alpha mask, so the alpha would not survive
+            raise ValueError("BMP images with an alpha channel are not supported")
+        target = 'RGBA' if self.channels == 4 else 'RGB'
+        if img.mode != target:
+            trace.progress(f"Converting the {img.mode} mode to {target} mode...")
+            img = img.convert(target)
+        self.pixels = np.array(img, dtype=np.uint8).reshape(-1)
+        if self.format == 'WEBP' and self.channels == 4 and self.pixels[3::4].min() == 255:
+            # libwebp drops an all-opaque alpha channel on save, so the stego image would read back as RGB
+            self.channels = 3
+            self.pixels = np.ascontiguousarray(self.pixels.reshape(-1, 4)[:, :3]).reshape(-1)
+
+    @property
+    def buffer(self):
+        return self.pixels
+
+    def layout(self, alpha=False, bits=1):
+        return image_layout(len(self.pixels), self.channels, alpha, bits)
+
+    def layouts(self):
+        return image_layouts(len(self.pixels), self.channels)
+
+    def salt_layout(self):
+        return image_salt_layout(len(self.pixels), self.channels)
+
+    def legacy_layout(self):
+        ### The original ordering: pixels of the whole carrier, from before the salt
+        return SlotLayout(len(self.pixels), SLOTS_DEFAULT, 1, 3, self.channels)
+
+    def to_image(self):
+        from PIL import Image
+        mode = 'RGBA' if self.channels == 4 else 'RGB'
+        return Image.fromarray(self.pixels.reshape(self.height, self.width, self.channels), mode)
+
+    def _metadata(self):
+        from PIL import PngImagePlugin
+        pnginfo = PngImagePlugin.PngInfo()
+        for key, value in self.text.items():
+            if isinstance(value, PngImagePlugin.iTXt):
+                pnginfo.add_itxt(key, value, value.lang, value.tkey)
+            else:
+                pnginfo.add_text(key, value)
+        if 'gamma' in self.info:
+            pnginfo.add(b'gAMA', struct.pack('>I', int(round(self.info['gamma'] * 100000))))
+        if 'srgb' in self.info:
+            pnginfo.add(b'sRGB', bytes([self.info['srgb']]))
+        options = {'pnginfo': pnginfo}
+        if 'icc_profile' in self.info:
+            options['icc_profile'] = self.info['icc_profile']
+        if 'dpi' in self.info:
+            options['dpi'] = self.info['dpi']
+        return options
+
+    def save(self, output, png=None):
+        ### Written back in the cover's format, or PNG for covers given as arrays / other formats
+        fmt = self.format if self.format in IMAGE_FORMATS else 'PNG'
+        if fmt == 'BMP':
+            self.to_image().save(output, format='BMP')
+            return
+        if fmt == 'TIFF':
+            compression = self.info.get('compression')
+            self.to_image().save(output, format='TIFF', compression=compression if compression in _TIFF_LOSSLESS else 'tiff_lzw')
+            return
+        if fmt == 'WEBP':
+            # exact keeps the colour of fully transparent pixels, which carry payload bits too
+            self.to_image().save(output, format='WEBP', lossless=True, quality=100, exact=True)
+            return
+        png = png or PngOptions()
+        if png.mode not in PNG_MODES:
+            raise ValueError(f"Unknown PNG mode {png.mode}")
+        options = dict(PNG_MODES[png.mode])
+        if png.compress_level is not None:
+            options['compress_level'] = png.compress_level
+        if png.strategy is not None:
+            options['compress_type'] = PNG_STRATEGIES[png.strategy]
+        if png.preserve:
+            options.update(self._metadata())
+        self.to_image().save(output, format='PNG', **options)
+
+
+def load_image(cover, formats=IMAGE_FORMATS):
+    # Pillow is only imported once an image is actually handled
+    from PIL import Image
+    if isinstance(cover, ImageCarrier):
+        return cover
+    if isinstance(cover, Image.Image):
+        return ImageCarrier(cover)
+    if isinstance(cover, np.ndarray):
+        return ImageCarrier(Image.fromarray(np.ascontiguousarray(cover, dtype=np.uint8)))
+
+    with trace.stage('decode') as record:
+        try:
+            img = Image.open(_as_file(cover))
+            if not img.format or img.format.upper() not in formats:
+                raise ValueError("unsupported format")
+            img.load()  # full decode; truncated or corrupt data fails here
+        except Exception:
+            raise ValueError(f"Carrier is not a valid {' / '.join(formats)} image file.")
+        carrier = ImageCarrier(img)
+        record['bytes'] = len(carrier.pixels)
+    return carrier
+
+
+def check_wav_params(params):
+    if not (1 <= params.nchannels <= 8):
+        return False
+    if params.sampwidth not in [1, 2, 3, 4]:
+        return False
+    if not (8000 <= params.framerate <= 192000):
+        return False
+    if params.nframes <= 0:
+        return False
+    return True
+
+
+class WavCarrier:
+    """
+    A decoded WAV: its params and the raw frame bytes as a uint8 buffer.
+    For a carrier from map_pcm the buffer is a memmap of the file at `path`.
+    """
+    kind = 'aud'
+    format = 'WAV'
+    big_endian = False
+
+    def __init__(self, params, frame_bytes, path=None):
+        self.params = params
+        self.frame_bytes = frame_bytes
+        self.path = path
+
+    @property
+    def buffer(self):
+        return self.frame_bytes
+
+    @property
+    def mapped(self):
+        return isinstance(self.frame_bytes, np.memmap)
+
+    def copy(self):
+        return WavCarrier(self.params, self.frame_bytes.copy())
+
+    def layout(self, low_byte=False, bits=1):
+        return wav_layout(len(self.frame_bytes), self.params.sampwidth, low_byte, bits, self.big_endian)
+
+    def layouts(self):
+        return wav_layouts(len(self.frame_bytes), self.params.sampwidth, self.big_endian)
+
+    def salt_layout(self):
+        return wav_salt_layout(len(self.frame_bytes), self.params.sampwidth, self.big_endian)
+
+    def legacy_layout(self):
+        ### The original ordering: every byte of the whole carrier, from before the salt
+        return SlotLayout(len(self.frame_bytes))
+
+    def save(self, output):
+        with wave.open(output, 'wb') as fd:
+            fd.setparams(self.params)
+            fd.writeframes(self.frame_bytes)
+
+
+def load_wav(cover, writable=False):
+    if isinstance(cover, WavCarrier):
+        if writable and not cover.frame_bytes.flags.writeable:
+            return cover.copy()
+        return cover
+
+    with trace.stage('decode') as record:
+        try:
+            with wave.open(_as_file(cover), 'rb') as song:
+                params = song.getparams()
+                if not check_wav_params(params):
+                    raise ValueError("unsupported parameters")
+                data = song.readframes(params.nframes)
+            if len(data) != params.nframes * params.nchannels * params.sampwidth:
+                raise ValueError("truncated frame data")
+        except Exception:
+            raise ValueError("Carrier is not a valid WAV file.")
+        record['bytes'] = len(data)
+
+    frame_bytes = np.frombuffer(data, dtype=np.uint8)
+    return WavCarrier(params, frame_bytes.copy() if writable else frame_bytes)
+
+
+class PcmCarrier(WavCarrier):
+    """
+    Sample data found at its offset inside a container file (WAV, AIFF or
+    headerless PCM). The bytes before and after it are kept as they are, so
+    the output only differs from the cover in the sample bits.
+    """
+
+    def __init__(self, format, params, frame_bytes, head=b'', tail=b'', big_endian=False, path=None):
+        super().__init__(params, frame_bytes, path)
+        self.format = format
+        self.head = head
+        self.tail = tail
+        self.big_endian = big_endian
+
+    def copy(self):
+        return PcmCarrier(self.format, self.params, self.frame_bytes.copy(), self.head, self.tail, self.big_endian)
+
+    def save(self, output):
+        if isinstance(output, str) or hasattr(output, '__fspath__'):
+            with open(output, 'wb') as f:
+                self.save(f)
+            return
+        output.write(self.head)
+        output.write(self.frame_bytes)
+        output.write(self.tail)
+
+
+WavParams = namedtuple('WavParams', ['nchannels', 'sampwidth', 'framerate', 'nframes', 'comptype', 'compname'])
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+### Headerless PCM has no rate to read; it only matters for check_wav_params
+RAW_FRAMERATE = 44100
+
+
+def _chunks(f, byte_order):
+    ### (id, data offset, size) of each chunk after a RIFF / IFF header, from chunk headers only
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return
+        kind, size = struct.unpack(byte_order + '4sI', chunk)
+        offset = f.tell()
+        yield kind, offset, size
+        f.seek(offset + size + (size & 1))  # chunks are word aligned
+
+
+def _extended(data):
+    ### 80-bit IEEE 754 extended float, which AIFF uses for the sample rate
+    exponent, mantissa = struct.unpack('>HQ', data)
+    value = mantissa * 2.0 ** ((exponent & 0x7fff) - 16383 - 63) if exponent & 0x7fff else 0.0
+    return -value if exponent & 0x8000 else value
+
+
+def _locate_wav(f, file_size):
+    ### (params, data offset, big endian) of a PCM WAV
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b'RIFF' or head[8:] != b'WAVE':
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    for kind, offset, size in _chunks(f, '<'):
+        if kind == b'fmt ':
+            f.seek(offset)
+            fmt = f.read(min(size, 26))
+            tag, nchannels, framerate, _, _, depth = struct.unpack('<HHIIHH', fmt[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) == 26:
+                tag = struct.unpack('<H', fmt[24:26])[0]  # first field of the sub-format GUID
+            if tag != WAVE_FORMAT_PCM:
+                raise ValueError("not PCM")
+        elif kind == b'data':
+            if fmt is None:
+                raise ValueError("data before fmt chunk")
+            sampwidth = (depth + 7) // 8
+            nframes = size // (nchannels * sampwidth)
+            return WavParams(nchannels, sampwidth, framerate, nframes, 'NONE', 'not compressed'), offset, False
+    raise ValueError("no data chunk")
+
+
+def _locate_aiff(f, file_size):
+    ### (params, data offset, big endian) of an AIFF or uncompressed AIFF-C file
+    head = f.read(12)
+    if len(head) < 12 or head[:4] != b'FORM' or head[8:] not in (b'AIFF', b'AIFC'):
+        raise ValueError("not an AIFF file")
+    params = start = None
+    big_endian = True
+    for kind, offset, size in _chunks(f, '>'):
+        if kind == b'COMM':
+            f.seek(offset)
+            nchannels, nframes, depth = struct.unpack('>hIh', f.read(8))
+            framerate = int(round(_extended(f.read(10))))
+            if head[8:] == b'AIFC':
+                comptype = f.read(4)
+                if comptype == b'sowt':
+                    big_endian = False
+                elif comptype not in (b'NONE', b'twos', b'raw '):
+                    raise ValueError("compressed AIFF-C")
+            params = WavParams(nchannels, (depth + 7) // 8, framerate, nframes, 'NONE', 'not compressed')
+        elif kind == b'SSND':
+            f.seek(offset)
+            data_offset = struct.unpack('>I', f.read(4))[0]
+            start = offset + 8 + data_offset
+            available = size - 8 - data_offset
+        if params is not None and start is not None:
+            # COMM's frame count is checked against SSND, so chunks after it are never written to
+            if params.nframes * params.nchannels * params.sampwidth > available:
+                raise ValueError("frame data runs past the SSND chunk")
+            return params, start, big_endian
+    raise ValueError("missing COMM or SSND chunk")
+
+
+def _raw_locator(sampwidth):
+    def locate(f, file_size):
+        return WavParams(1, sampwidth, RAW_FRAMERATE, file_size // sampwidth, 'NONE', 'not compressed'), 0, False
+    return locate
+
+
+### How to find the sample data of each PCM container; the PCM* ones are headerless little-endian
+PCM_FORMATS = {
+    'WAV': _locate_wav,
+    'AIFF': _locate_aiff,
+    'PCM8': _raw_locator(1),
+    'PCM16': _raw_locator(2),
+    'PCM24': _raw_locator(3),
+    'PCM32': _raw_locator(4),
+}
+
+
+def locate_pcm(f, format, file_size):
+    ### (params, data offset, big endian) from the headers of an open file, validated
+    params, offset, big_endian = PCM_FORMATS[format](f, file_size)
+    if not check_wav_params(params):
+        raise ValueError("unsupported parameters")
+    if offset + params.nframes * params.nchannels * params.sampwidth > file_size:
+        raise ValueError("truncated frame data")
+    return params, offset, big_endian
+
+
+def load_pcm(cover, format, writable=False):
+    """Load a WAV, AIFF or raw PCM carrier, keeping the bytes around its sample data."""
+    if isinstance(cover, WavCarrier):
+        return load_wav(cover, writable)
+
+    with trace.stage('decode') as record:
+        try:
+            if isinstance(cover, str) or hasattr(cover, '__fspath__'):
+                with open(cover, 'rb') as f:
+                    data = f.read()
+            else:
+                data = _as_file(cover).read()
+            params, offset, big_endian = locate_pcm(io.BytesIO(data), format, len(data))
+        except Exception:
+            raise ValueError(f"Carrier is not a valid {format} file.")
+        length = params.nframes * params.nchannels * params.sampwidth
+        record['bytes'] = length
+
+    frame_bytes = np.frombuffer(data, dtype=np.uint8, count=length, offset=offset)
+    return PcmCarrier(format, params, frame_bytes.copy() if writable else frame_bytes,
+                      data[:offset], data[offset + length:], big_endian)
+
+
+def map_pcm(path, format='WAV', writable=False):
+    """
+    Map the sample data of a WAV, AIFF or raw PCM file instead of reading
+    it. Only the chunk headers are parsed. Extraction then touches just the
+    pages holding payload bits, and with writable=True embedding patches
+    the file in place.
+    """
+    with trace.stage('map') as record:
+        try:
+            with open(path, 'rb') as f:
+                file_size = os.fstat(f.fileno()).st_size
+                params, offset, big_endian = locate_pcm(f, format, file_size)
+                length = params.nframes * params.nchannels * params.sampwidth
+                f.seek(0)
+                head = f.read(offset)
+                f.seek(offset + length)
+                tail = f.read()
+        except Exception:
+            raise ValueError(f"Carrier is not a valid {format} file.")
+
+        frame_bytes = np.memmap(path, dtype=np.uint8, mode='r+' if writable else 'r', offset=offset, shape=(length,))
+        record['bytes'] = length
+    return PcmCarrier(format, params, frame_bytes, head, tail, big_endian, path)
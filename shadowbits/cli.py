@@ -1,11 +1,72 @@
 import argparse
-from .emb_img import embed_file  
-from .ext_img import extract_file
-from .emb_aud import embed_audio
-from .ext_aud import extract_audio
+import json
+import os
+import sys
+# Only modules that import nothing heavy are loaded up front; numpy, Pillow and
+# pycryptodome come in with the modules each subcommand imports when it runs
+from .options import SCHEMES, KEYED, MAX_BITS, PNG_MODES, PNG_STRATEGIES
+from .compress import COMPRESSION_CHOICES, AUTO
+from .trace import Tracer, json_lines, set_tracer, progress
+
+FORMAT_HELP = 'png, bmp, tiff, webp, wav, aiff or pcm8/16/24/32'
+
+
+def png_options(args):
+    from .carrier import PngOptions
+    return PngOptions(args.png_mode, args.png_level, args.png_strategy, args.preserve_metadata)
+
+
+def run_batch_command(kind, args):
+    from .batch import load_manifest, run_batch
+    failed = 0
+    for result in run_batch(load_manifest(args.manifest), kind, args.mode, args.workers, args.reuse_salt):
+        print(json.dumps(result), flush=True)
+        if not result['ok']:
+            failed += 1
+    print(f"Batch finished with {failed} failed item(s).")
+    if failed:
+        raise SystemExit(1)
+
+
+def run_capacity_command(kind, args):
+    from .capacity import image_capacity, audio_capacity, select_cover
+    mode = 'alpha' if getattr(args, 'alpha', False) else 'low-byte' if getattr(args, 'low_byte', False) else 'default'
+    if args.select:
+        if not args.input:
+            raise ValueError("--select needs the payload given with --in")
+        best = select_cover(args.select, os.path.getsize(args.input), kind, mode, args.bits)
+        if best is None:
+            raise ValueError(f"No cover in {args.select} can hold {args.input} ({mode}, {args.bits} bit(s))")
+        path, entry = best
+        if args.json:
+            print(json.dumps(dict(entry, cover=path)))
+        else:
+            print(path)
+        return
+
+    if not args.cover:
+        raise ValueError("Give a cover with --cover or a directory with --select")
+    info = image_capacity(args.cover) if kind == 'img' else audio_capacity(args.cover)
+    if args.json:
+        print(json.dumps(dict(info, cover=args.cover)))
+        return
+    for entry in info['modes']:
+        print(f"{entry['mode']:>8} {entry['bits']} bit(s): {entry['max_payload']:,} bytes")
 
 
 def main():
+    # Options shared by every embed/extract action
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--quiet', action='store_true', help='Do not print progress messages')
+    common.add_argument('--profile', nargs='?', const='-', metavar='FILE', help='Write per-stage timing, bytes and peak allocations as JSON lines (default: stderr)')
+
+    # Output encoding options for PNG stego images
+    png_flags = argparse.ArgumentParser(add_help=False)
+    png_flags.add_argument('--png-mode', choices=PNG_MODES, default='default', help='Output encoding: fast = zlib level 1, optimize = smallest file, store = uncompressed')
+    png_flags.add_argument('--png-level', type=int, choices=range(10), help='zlib level for the output PNG (overrides --png-mode)')
+    png_flags.add_argument('--png-strategy', choices=PNG_STRATEGIES, help='zlib strategy for the output PNG')
+    png_flags.add_argument('--preserve-metadata', action='store_true', help='Copy text, ICC profile, DPI, gamma and sRGB chunks from the cover')
+
     parser = argparse.ArgumentParser(description='Steganography tool for hiding files in images')
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
@@ -13,28 +74,103 @@ def main():
     # Embed command for image
     img_parser = subparsers.add_parser('img', help='Image operations')
     img_subparser = img_parser.add_subparsers(dest='action' , help='Image actions')
-    embed_cmd = img_subparser.add_parser('embed', help='Hide a file in an image')
+    embed_cmd = img_subparser.add_parser('embed', help='Hide a file in an image', parents=[common, png_flags])
     embed_cmd.add_argument('--in', dest='input', required=True, help='File to hide')    
-    embed_cmd.add_argument('--cover', dest='image', required=True, help='Cover image')
+    embed_cmd.add_argument('--cover', dest='image', required=True, help='Cover image (PNG, BMP, TIFF or WebP)')
     embed_cmd.add_argument('--key', required=True, help='Secret key for randomization')
+    embed_cmd.add_argument('--scheme', choices=SCHEMES, default=KEYED, help='Position selection scheme (legacy = old shuffle)')
+    embed_cmd.add_argument('--compress', choices=COMPRESSION_CHOICES, default=AUTO, help='Compress the payload before encryption (auto = pick from a sample)')
+    embed_cmd.add_argument('--bits', type=int, choices=range(1, MAX_BITS + 1), default=1, help='Low bits used in each channel')
+    embed_cmd.add_argument('--alpha', action='store_true', help='Also use the alpha channel of RGBA covers')
 
     # Extract command for image
-    extract_cmd = img_subparser.add_parser('extract', help='Extract hidden file from image')
+    extract_cmd = img_subparser.add_parser('extract', help='Extract hidden file from image', parents=[common])
     extract_cmd.add_argument('--stego', required=True, help='Image with hidden file')
     extract_cmd.add_argument('--key', required=True, help='Secret key used for hiding')
+    extract_cmd.add_argument('--scheme', choices=SCHEMES, default=KEYED, help='Position selection scheme (legacy = files made by older versions)')
+
+    # Batch command for image
+    batch_cmd = img_subparser.add_parser('batch', help='Embed or extract many images from a manifest')
+    batch_cmd.add_argument('--manifest', required=True, help='CSV or JSONL with cover, payload, key, output')
+    batch_cmd.add_argument('--mode', choices=['embed', 'extract'], default='embed', help='Operation to run on every item')
+    batch_cmd.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    batch_cmd.add_argument('--reuse-salt', action='store_true', help='Run scrypt once per key and worker; the outputs then share a visible salt')
+
+    # Capacity command for image
+    capacity_cmd = img_subparser.add_parser('capacity', help='Show how much a cover image can hold (reads only the file header)')
+    capacity_cmd.add_argument('--cover', help='Cover image')
+    capacity_cmd.add_argument('--select', metavar='DIR', help='Print the smallest cover in DIR that fits the payload')
+    capacity_cmd.add_argument('--in', dest='input', help='Payload to fit (with --select)')
+    capacity_cmd.add_argument('--bits', type=int, choices=range(1, MAX_BITS + 1), default=1, help='Low bits used in each channel (with --select)')
+    capacity_cmd.add_argument('--alpha', action='store_true', help='Also use the alpha channel (with --select)')
+    capacity_cmd.add_argument('--json', action='store_true', help='Print JSON instead of a table')
 
     # Embed command for audio
     aud_parser = subparsers.add_parser('aud', help='Audio operation')
     aud_subparser = aud_parser.add_subparsers(dest='action', help='Audio actions')
-    embed_audio_cmd = aud_subparser.add_parser('embed', help='Hide a file in an audio file')
+    embed_audio_cmd = aud_subparser.add_parser('embed', help='Hide a file in an audio file', parents=[common])
     embed_audio_cmd.add_argument('--in', dest='input', required=True, help='File to hide')
-    embed_audio_cmd.add_argument('--cover', dest='song', required=True, help='Cover audio')
+    embed_audio_cmd.add_argument('--cover', dest='song', required=True, help='Cover audio (WAV, AIFF or raw PCM)')
     embed_audio_cmd.add_argument('--key', required=True, help='Secret key to randomize bits')
+    embed_audio_cmd.add_argument('--scheme', choices=SCHEMES, default=KEYED, help='Position selection scheme (legacy = old shuffle)')
+    embed_audio_cmd.add_argument('--compress', choices=COMPRESSION_CHOICES, default=AUTO, help='Compress the payload before encryption (auto = pick from a sample)')
+    embed_audio_cmd.add_argument('--bits', type=int, choices=range(1, MAX_BITS + 1), default=1, help='Low bits used in each byte')
+    embed_audio_cmd.add_argument('--low-byte', action='store_true', help='Only use the low byte of each sample')
+    embed_audio_cmd.add_argument('--no-mmap', dest='mmap', action='store_false', help='Load the cover into memory instead of patching a mapped copy')
 
     # Extract command for audio
-    extract_audio_cmd = aud_subparser.add_parser('extract', help='Extract hidden file from audio')
+    extract_audio_cmd = aud_subparser.add_parser('extract', help='Extract hidden file from audio', parents=[common])
     extract_audio_cmd.add_argument('--stego', required=True, help='Audio with hidden file')
     extract_audio_cmd.add_argument('--key', required=True, help='Secret key used for hiding')
+    extract_audio_cmd.add_argument('--scheme', choices=SCHEMES, default=KEYED, help='Position selection scheme (legacy = files made by older versions)')
+    extract_audio_cmd.add_argument('--no-mmap', dest='mmap', action='store_false', help='Load the stego file into memory instead of mapping it')
+
+    # Batch command for audio
+    batch_audio_cmd = aud_subparser.add_parser('batch', help='Embed or extract many audio files from a manifest')
+    batch_audio_cmd.add_argument('--manifest', required=True, help='CSV or JSONL with cover, payload, key, output')
+    batch_audio_cmd.add_argument('--mode', choices=['embed', 'extract'], default='embed', help='Operation to run on every item')
+    batch_audio_cmd.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    batch_audio_cmd.add_argument('--reuse-salt', action='store_true', help='Run scrypt once per key and worker; the outputs then share a visible salt')
+
+    # Capacity command for audio
+    capacity_audio_cmd = aud_subparser.add_parser('capacity', help='Show how much a cover audio can hold (reads only the file header)')
+    capacity_audio_cmd.add_argument('--cover', help='Cover audio')
+    capacity_audio_cmd.add_argument('--select', metavar='DIR', help='Print the smallest cover in DIR that fits the payload')
+    capacity_audio_cmd.add_argument('--in', dest='input', help='Payload to fit (with --select)')
+    capacity_audio_cmd.add_argument('--bits', type=int, choices=range(1, MAX_BITS + 1), default=1, help='Low bits used in each byte (with --select)')
+    capacity_audio_cmd.add_argument('--low-byte', action='store_true', help='Only use the low byte of each sample (with --select)')
+    capacity_audio_cmd.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+
+    # Embed / extract with the carrier format detected from the file
+    embed_any_cmd = subparsers.add_parser('embed', help='Hide a file in any supported carrier', parents=[common, png_flags])
+    embed_any_cmd.add_argument('--in', dest='input', required=True, nargs='+', help='File(s) to hide')
+    embed_any_cmd.add_argument('--container', action='store_true', help='Store the files as named entries behind a table of contents (implied by more than one --in)')
+    embed_any_cmd.add_argument('--cover', required=True, help='Cover image or audio file')
+    embed_any_cmd.add_argument('--out', dest='output', help='Stego file to write (default: named after the carrier kind)')
+    embed_any_cmd.add_argument('--key', required=True, help='Secret key for randomization')
+    embed_any_cmd.add_argument('--scheme', choices=SCHEMES, default=KEYED, help='Position selection scheme (legacy = old shuffle)')
+    embed_any_cmd.add_argument('--compress', choices=COMPRESSION_CHOICES, default=AUTO, help='Compress the payload before encryption (auto = pick from a sample)')
+    embed_any_cmd.add_argument('--bits', type=int, choices=range(1, MAX_BITS + 1), default=1, help='Low bits used in each channel / byte')
+    embed_any_cmd.add_argument('--alpha', action='store_true', help='Also use the alpha channel of RGBA covers')
+    embed_any_cmd.add_argument('--low-byte', action='store_true', help='Only use the low byte of each audio sample')
+    embed_any_cmd.add_argument('--format', help=f'Carrier format: {FORMAT_HELP} (default: detected; needed for raw PCM other than 16-bit .pcm/.raw)')
+    embed_any_cmd.add_argument('--no-mmap', dest='mmap', action='store_false', help='Load the cover into memory instead of patching a mapped copy')
+
+    extract_any_cmd = subparsers.add_parser('extract', help='Extract a hidden file from any supported carrier', parents=[common])
+    extract_any_cmd.add_argument('--stego', required=True, help='Image or audio file with hidden file')
+    extract_any_cmd.add_argument('--out', dest='output', help='Where to write the hidden file (default: named after its type), or the directory for container entries')
+    extract_any_cmd.add_argument('--list', action='store_true', help='List the files of a container')
+    extract_any_cmd.add_argument('--entry', action='append', metavar='NAME', help='Extract only this file of a container (repeatable)')
+    extract_any_cmd.add_argument('--all', action='store_true', help='Extract every file of a container')
+    extract_any_cmd.add_argument('--key', required=True, help='Secret key used for hiding')
+    extract_any_cmd.add_argument('--scheme', choices=SCHEMES, default=KEYED, help='Position selection scheme (legacy = files made by older versions)')
+    extract_any_cmd.add_argument('--format', help=f'Carrier format: {FORMAT_HELP} (default: detected)')
+    extract_any_cmd.add_argument('--no-mmap', dest='mmap', action='store_false', help='Load the stego file into memory instead of mapping it')
+
+    # Persistent worker
+    serve_cmd = subparsers.add_parser('serve', help='Answer JSON-RPC requests (one per line) with libraries and keys kept loaded')
+    serve_cmd.add_argument('--socket', metavar='PATH', help='Listen on a Unix socket instead of stdin/stdout')
+    serve_cmd.add_argument('--profile', nargs='?', const='-', metavar='FILE', help='Write per-stage events as JSON lines (default: stderr)')
 
 
     args = parser.parse_args()
@@ -43,32 +179,92 @@ def main():
         parser.print_help()
         exit(1)
 
+    profile = None
+    if getattr(args, 'profile', None):
+        profile = sys.stderr if args.profile == '-' else open(args.profile, 'a')
+    # serve answers on stdout, so it never prints progress
+    set_tracer(Tracer(callback=json_lines(profile) if profile else None,
+                      progress=not getattr(args, 'quiet', False) and args.command != 'serve', memory=profile is not None))
+
     try:
         if args.command == 'img':
             if args.action == 'embed':
-                embed_file(args.image, args.input, args.key)
-                print(f"Successfully embedded {args.input} in {args.image}.")
+                from .emb_img import embed_file
+                png = png_options(args)
+                embed_file(args.image, args.input, args.key, args.scheme, compression=args.compress, bits=args.bits, alpha=args.alpha, png=png)
+                progress(f"Successfully embedded {args.input} in {args.image}.")
             elif args.action == 'extract':
-                extract_file(args.stego, args.key)
-                print(f"Successfully extracted hidden file from {args.stego}.")
+                from .ext_img import extract_file
+                extract_file(args.stego, args.key, args.scheme)
+                progress(f"Successfully extracted hidden file from {args.stego}.")
+            elif args.action == 'batch':
+                run_batch_command('img', args)
+            elif args.action == 'capacity':
+                run_capacity_command('img', args)
             else:
                 img_parser.print_help()
                 raise SystemExit(1)
         
         elif args.command == 'aud':
             if args.action == 'embed':
-                embed_audio(args.song, args.input, args.key)
-                print(f"Successfully embedded {args.input} in {args.song}.")
+                from .emb_aud import embed_audio
+                embed_audio(args.song, args.input, args.key, args.scheme, compression=args.compress, bits=args.bits, low_byte=args.low_byte, mmap=args.mmap)
+                progress(f"Successfully embedded {args.input} in {args.song}.")
             elif args.action == 'extract':
-                extract_audio(args.stego, args.key)
-                print(f"Successfully extracted hidden file from {args.stego}.")
+                from .ext_aud import extract_audio
+                payload = extract_audio(args.stego, args.key, args.scheme, mmap=args.mmap)
+                if payload is None:
+                    raise ValueError(f"No hidden file could be extracted from {args.stego}")
+                progress(f"Successfully extracted hidden file from {args.stego}.")
+            elif args.action == 'batch':
+                run_batch_command('aud', args)
+            elif args.action == 'capacity':
+                run_capacity_command('aud', args)
             else:
                 aud_parser.print_help()
                 raise SystemExit(1)
 
+        elif args.command == 'embed':
+            if args.container or len(args.input) > 1:
+                if args.scheme != KEYED:
+                    raise ValueError("Containers only support the keyed scheme")
+                from .engine import embed_entries_path
+                output = embed_entries_path(args.cover, args.input, args.key, args.output, args.compress, args.bits, args.alpha,
+                                            args.low_byte, png_options(args), mmap=args.mmap, format=args.format)
+            else:
+                from .engine import embed_path
+                output = embed_path(args.cover, args.input[0], args.key, args.scheme, args.output, args.compress, args.bits,
+                                    alpha=args.alpha, low_byte=args.low_byte, png=png_options(args), mmap=args.mmap, format=args.format)
+            progress(f"Successfully embedded {', '.join(args.input)} in {output}.")
+
+        elif args.command == 'extract':
+            if args.list:
+                from .engine import open_container_path
+                container = open_container_path(args.stego, args.key, mmap=args.mmap, format=args.format)
+                for entry in container.entries:
+                    print(f"{entry.size:>12,} {entry.mime:<28} {entry.name}")
+            elif args.entry or args.all:
+                from .engine import extract_entries_path
+                outputs = extract_entries_path(args.stego, args.key, args.entry, args.output, mmap=args.mmap, format=args.format)
+                progress(f"Successfully extracted {', '.join(outputs)} from {args.stego}.")
+            else:
+                from .engine import extract_path
+                output = extract_path(args.stego, args.key, args.scheme, args.output, mmap=args.mmap, format=args.format)
+                progress(f"Successfully extracted hidden file from {args.stego} to {output}.")
+
+        elif args.command == 'serve':
+            from .serve import serve_socket, serve_stdio
+            if args.socket:
+                serve_socket(args.socket)
+            else:
+                serve_stdio()
+
     except Exception as e:
         print(f"Error: {e}")
         exit(1)
+    finally:
+        if profile is not None and profile is not sys.stderr:
+            profile.close()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Optional compression applied to the payload before encryption. The codec
+id is recorded in the payload header so extraction knows how to undo it.
+"""
+import bz2
+import lzma
+import zlib
+
+### Codec ids recorded in the payload header
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_BZ2 = 2
+CODEC_LZMA = 3
+
+CODECS = {'none': CODEC_NONE, 'zlib': CODEC_ZLIB, 'bz2': CODEC_BZ2, 'lzma': CODEC_LZMA}
+CODEC_NAMES = {codec: name for name, codec in CODECS.items()}
+AUTO = 'auto'
+COMPRESSION_CHOICES = (AUTO,) + tuple(CODECS)
+
+SAMPLE_SIZE = 1 << 18
+### A slower codec has to shrink the sample by this much more than the faster pick to win
+MIN_GAIN = 0.05
+
+_COMPRESSORS = {
+    CODEC_ZLIB: lambda: zlib.compressobj(6),
+    CODEC_BZ2: lambda: bz2.BZ2Compressor(9),
+    CODEC_LZMA: lambda: lzma.LZMACompressor(preset=6),
+}
+
+### Cheaper settings that only rank the codecs on the sample: a low bz2 level and a fast lzma
+### preset with a dictionary no larger than the sample. The real compressors do at least as well
+_PROBES = {
+    CODEC_ZLIB: lambda size: zlib.compressobj(6),
+    CODEC_BZ2: lambda size: bz2.BZ2Compressor(1),
+    CODEC_LZMA: lambda size: lzma.LZMACompressor(filters=[{'id': lzma.FILTER_LZMA2, 'preset': 1, 'dict_size': max(size, 1 << 12)}]),
+}
+
+_DECOMPRESSORS = {
+    CODEC_ZLIB: zlib.decompressobj,
+    CODEC_BZ2: bz2.BZ2Decompressor,
+    CODEC_LZMA: lzma.LZMADecompressor,
+}
+
+
+def _probe(codec, sample):
+    compressor = _PROBES[codec](len(sample))
+    return len(compressor.compress(sample) + compressor.flush())
+
+
+def choose_codec(sample):
+    """
+    Pick a codec from a leading sample of the payload. Codecs are tried
+    fastest first and a slower one is only taken when it saves at least
+    MIN_GAIN of the sample over the current pick. When zlib does not save
+    MIN_GAIN the payload is taken as already compressed (archives, media)
+    and stays uncompressed without trying the others.
+    """
+    sample = bytes(sample[:SAMPLE_SIZE])
+    if not sample:
+        return CODEC_NONE
+    best, best_size = CODEC_ZLIB, _probe(CODEC_ZLIB, sample)
+    if best_size >= len(sample) * (1 - MIN_GAIN):
+        return CODEC_NONE
+    for codec in (CODEC_BZ2, CODEC_LZMA):
+        size = _probe(codec, sample)
+        if size < best_size - MIN_GAIN * len(sample):
+            best, best_size = codec, size
+    return best
+
+
+def resolve_codec(compression, sample):
+    if compression == AUTO:
+        return choose_codec(sample)
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression {compression}")
+    return CODECS[compression]
+
+
+def compress_chunks(codec, chunks):
+    if codec == CODEC_NONE:
+        yield from chunks
+        return
+    compressor = _COMPRESSORS[codec]()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def decompress_chunks(codec, chunks):
+    if codec == CODEC_NONE:
+        yield from chunks
+        return
+    if codec not in _DECOMPRESSORS:
+        raise ValueError(f"Unsupported payload compression {codec}")
+    decompressor = _DECOMPRESSORS[codec]()
+    for chunk in chunks:
+        data = decompressor.decompress(chunk)
+        if data:
+            yield data
+    if codec == CODEC_ZLIB:
+        data = decompressor.flush()
+        if data:
+            yield data
+    if not decompressor.eof:
+        raise ValueError("Compressed payload is truncated")
@@ -0,0 +1,51 @@
+"""
+Table of contents of a container: several files hidden in one carrier.
+
+After the header (content = CONTENT_CONTAINER) comes the table of contents,
+encrypted in one piece, then the end marker, then each entry as its own
+STREAM ciphertext, back to back. Entry offsets count from the end of the
+marker, so one entry is read by decoding only the header, the table and
+that entry's bit positions.
+"""
+import json
+from collections import namedtuple
+
+TOC_VERSION = 1
+
+### offset and length locate the entry's ciphertext, size is the file's own size,
+### extension / mime its type from validator.detect_file_type
+Entry = namedtuple('Entry', ['name', 'offset', 'length', 'size', 'codec', 'extension', 'mime'])
+
+
+def pack_toc(entries):
+    toc = {'version': TOC_VERSION, 'entries': [entry._asdict() for entry in entries]}
+    return json.dumps(toc, separators=(',', ':')).encode()
+
+
+def parse_toc(data):
+    try:
+        toc = json.loads(data.decode())
+        version = toc['version']
+        entries = [Entry(**entry) for entry in toc['entries']]
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Table of contents is corrupted")
+    if version != TOC_VERSION:
+        raise ValueError(f"Unsupported table of contents version {version}")
+    return entries
+
+
+def check_names(names):
+    seen = set()
+    for name in names:
+        if not name:
+            raise ValueError("Container entries need a name")
+        if name in seen:
+            raise ValueError(f"Duplicate entry name {name}")
+        seen.add(name)
+
+
+def find_entry(entries, name):
+    for entry in entries:
+        if entry.name == name:
+            return entry
+    raise ValueError(f"No entry named {name} in the container")
@@ -1,5 +1,14 @@
 import hashlib
+import os
+from functools import lru_cache
 from Crypto.Cipher import AES
+from ..header import (SALT_SIZE, AEAD_EAX, AEAD_STREAM, SEGMENT_LOG, STREAM_PREFIX_SIZE, TAG_SIZE,
+                      stream_ciphertext_size)
+
+SCRYPT_LOG_N = 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+KEY_CACHE_SIZE = 64
 
 def derive_key(password):
     return hashlib.sha256(password.encode()).digest()
@@ -8,8 +17,54 @@ def to_seed(password: str) -> int:
     digest = hashlib.sha256(password.encode()).digest()
     return int.from_bytes(digest, 'big')
 
+
+class KeyContext:
+    """
+    Key material derived once per (password, salt): scrypt yields the AES
+    key and the permutation seed together, so every password guess pays
+    for scrypt before it can even locate the header.
+    """
+
+    def __init__(self, password, salt):
+        self.password = password
+        self.salt = salt
+        derived = hashlib.scrypt(password.encode(), salt=salt, n=1 << SCRYPT_LOG_N, r=SCRYPT_R, p=SCRYPT_P,
+                                 maxmem=256 * SCRYPT_R * (1 << SCRYPT_LOG_N), dklen=64)
+        self.aes_key = derived[:32]
+        self.seed = int.from_bytes(derived[32:], 'big')
+
+    @classmethod
+    def new(cls, password):
+        return cls(password, os.urandom(SALT_SIZE))
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def get_key_context(password, salt):
+    return KeyContext(password, salt)
+
+
+def key_password(key):
+    return key.password if isinstance(key, KeyContext) else key
+
+def legacy_seed(key):
+    ### The original formats shuffle with the unsalted SHA-256 of the password
+    return to_seed(key_password(key))
+
+def embedding_context(key):
+    ### A fresh salt per call unless the caller hands in a context to reuse
+    return key if isinstance(key, KeyContext) else KeyContext.new(key)
+
+def key_for_salt(key, salt):
+    if isinstance(key, KeyContext) and key.salt == salt:
+        return key
+    return get_key_context(key_password(key), salt)
+
+def _aes_key(key):
+    return key.aes_key if isinstance(key, KeyContext) else derive_key(key)
+
+
 def encryption(payload, key):
-    cipher = AES.new(derive_key(key), AES.MODE_EAX)
+    cipher = AES.new(_aes_key(key), AES.MODE_EAX)
     ciphertext, tag = cipher.encrypt_and_digest(payload)
     payload = cipher.nonce + tag + ciphertext
     return payload
@@ -20,9 +75,64 @@ def decryption(payload, key):
     nonce = payload[:16]
     tag = payload[16:32]
     ciphertext = payload[32:]
-    cipher = AES.new(derive_key(key), AES.MODE_EAX, nonce=nonce)
+    cipher = AES.new(_aes_key(key), AES.MODE_EAX, nonce=nonce)
     try:
         payload = cipher.decrypt_and_verify(ciphertext, tag)
         return payload
     except ValueError as e:
-        raise ValueError("Decryption failed - wrong key or corrupted data")
\ No newline at end of file
+        raise ValueError("Decryption failed - wrong key or corrupted data")
+
+
+def _segments(chunks, size):
+    ### Re-cut arbitrary chunks into fixed-size segments, flagging the last one
+    buffer = bytearray()
+    previous = None
+    for chunk in chunks:
+        buffer += chunk
+        while len(buffer) >= size:
+            if previous is not None:
+                yield previous, False
+            previous = bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        if previous is not None:
+            yield previous, False
+        yield bytes(buffer), True
+    elif previous is not None:
+        yield previous, True
+    else:
+        yield b'', True
+
+def _segment_cipher(aes_key, prefix, counter, last):
+    # nonce = random prefix | segment counter | last-segment flag
+    nonce = prefix + counter.to_bytes(4, 'big') + (b'\x01' if last else b'\x00')
+    return AES.new(aes_key, AES.MODE_EAX, nonce=nonce)
+
+def encrypt_stream(chunks, key, segment_size=1 << SEGMENT_LOG):
+    """
+    Encrypt an iterable of plaintext chunks segment by segment. Yields the
+    nonce prefix, then ciphertext + tag for each segment, so only one
+    segment is held in memory at a time.
+    """
+    aes_key = _aes_key(key)
+    prefix = os.urandom(STREAM_PREFIX_SIZE)
+    yield prefix
+    for counter, (segment, last) in enumerate(_segments(chunks, segment_size)):
+        ciphertext, tag = _segment_cipher(aes_key, prefix, counter, last).encrypt_and_digest(segment)
+        yield ciphertext + tag
+
+def decrypt_stream(prefix, chunks, key, segment_size=1 << SEGMENT_LOG):
+    """
+    Inverse of encrypt_stream, given the nonce prefix and the remaining
+    ciphertext chunks. Each segment is verified before it is yielded, and a
+    stream cut short fails on the last-segment flag.
+    """
+    aes_key = _aes_key(key)
+    for counter, (unit, last) in enumerate(_segments(chunks, segment_size + TAG_SIZE)):
+        if len(unit) < TAG_SIZE:
+            raise ValueError("Encrypted payload too short")
+        cipher = _segment_cipher(aes_key, prefix, counter, last)
+        try:
+            yield cipher.decrypt_and_verify(unit[:-TAG_SIZE], unit[-TAG_SIZE:])
+        except ValueError:
+            raise ValueError("Decryption failed - wrong key or corrupted data")
\ No newline at end of file
@@ -0,0 +1,186 @@
+"""
+Path-based embedding and extraction for every carrier format. The format
+is detected from the cover (see backends.py), so emb_img / ext_img /
+emb_aud / ext_aud and the CLI are thin wrappers around embed_path and
+extract_path.
+"""
+import os
+import shutil
+import time
+from contextlib import ExitStack
+from . import api, trace
+from .backends import detect_backend, open_carrier
+from .compress import AUTO
+from .container import find_entry
+from .positions import KEYED
+from .validator import detect_file_type
+
+### Default output names, per carrier kind
+STEGO_NAMES = {'img': 'stego_file', 'aud': 'encoded'}
+EXTRACTED_NAMES = {'img': 'extracted_file', 'aud': 'hidden_file'}
+
+
+def _default_output(name, extension):
+    output_path = f"{name}{extension}"
+    counter = 1
+    while os.path.exists(output_path):
+        output_path = f"{name}({counter}){extension}"
+        counter += 1
+    return output_path
+
+
+def _map_copy(backend, cover_path, output_path):
+    ### Copy the cover to the output and map its sample data, or None if it can't be mapped
+    try:
+        backend.map(cover_path)
+    except ValueError:
+        return None
+    with trace.stage('copy', "Copying cover file...", os.path.getsize(cover_path)):
+        shutil.copyfile(cover_path, output_path)
+    return backend.map(output_path, True)
+
+
+def save_extracted(chunks, output_path, default_name):
+    ### Name the output from the first decrypted chunk, then stream the rest after it
+    first = next(chunks, b'')
+    extension, mime_type = detect_file_type(first)
+    output_path = output_path or f"{default_name}.{extension}"
+
+    ### Later segments are decrypted as they are written, so this stage covers both
+    try:
+        with trace.stage('decrypt_save', "Saving the extracted file...") as record:
+            record['bytes'] = len(first)
+            with open(output_path, 'wb') as f:
+                f.write(first)
+                for chunk in chunks:
+                    f.write(chunk)
+                    record['bytes'] += len(chunk)
+    except Exception:
+        # A later segment failed to authenticate; don't leave a partial file behind
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
+
+
+def _stego_carrier(cover_path, output_path, mmap, kind, format):
+    ### (carrier, output path) for embedding: a mapped copy of the cover when the format allows it
+    backend = detect_backend(cover_path, kind, format)
+
+    if output_path is None:
+        extension = backend.extensions[0] if backend.extensions else os.path.splitext(cover_path)[1]
+        output_path = _default_output(STEGO_NAMES[backend.kind], extension)
+
+    carrier = None
+    if mmap and backend.map is not None and os.path.abspath(cover_path) != os.path.abspath(output_path):
+        carrier = _map_copy(backend, cover_path, output_path)
+    if carrier is None:
+        carrier = open_carrier(cover_path, writable=True, format=backend.name)
+    return carrier, output_path
+
+
+def embed_path(cover_path, payload_path, key, scheme=KEYED, output_path=None, compression=AUTO, bits=1,
+               alpha=False, low_byte=False, png=None, threads=1, mmap=True, kind=None, format=None):
+    """
+    Hide the file at `payload_path` in the cover at `cover_path` and return
+    the output path. The output keeps the cover's format. Formats that can
+    be mapped (WAV, AIFF, raw PCM) are copied to the output and patched in
+    place unless mmap=False.
+    """
+    start = time.time()
+    if not os.path.exists(cover_path):
+        raise FileNotFoundError(f"Cover file {cover_path} not found.")
+    if not os.path.exists(payload_path):
+        raise FileNotFoundError(f"Payload file {payload_path} not found.")
+    carrier, output_path = _stego_carrier(cover_path, output_path, mmap, kind, format)
+
+    trace.progress("Loading payload file...")
+    try:
+        with open(payload_path, 'rb') as payload:
+            api.embed(carrier, payload, key, scheme, output_path, compression, bits, alpha, low_byte, png, threads)
+    except Exception:
+        if getattr(carrier, 'mapped', False):
+            os.remove(output_path)  # don't leave a half-embedded copy of the cover behind
+        raise
+    trace.progress(f"Time taken: {int(time.time() - start)} seconds.")
+    return output_path
+
+
+def extract_path(stego_path, key, scheme=KEYED, output_path=None, threads=1, mmap=True, kind=None, format=None):
+    """
+    Recover the payload hidden in the file at `stego_path` and write it to
+    `output_path`, or to a name with the extension of its detected type.
+    Returns the output path.
+    """
+    start = time.time()
+    if not os.path.exists(stego_path):
+        raise FileNotFoundError(f"Stego file {stego_path} not found.")
+    backend = detect_backend(stego_path, kind, format)
+    carrier = open_carrier(stego_path, mmap=mmap, format=backend.name)
+
+    chunks = api.extract_chunks(carrier, key, scheme, threads)
+    output_path = save_extracted(chunks, output_path, EXTRACTED_NAMES[backend.kind])
+    trace.progress(f"Time taken: {int(time.time() - start)} seconds.")
+    return output_path
+
+
+def embed_entries_path(cover_path, payload_paths, key, output_path=None, compression=AUTO, bits=1, alpha=False,
+                       low_byte=False, png=None, threads=1, mmap=True, kind=None, format=None):
+    """
+    Hide the files at `payload_paths` in one cover as a container, each
+    entry named after its file name, and return the output path.
+    """
+    start = time.time()
+    if not os.path.exists(cover_path):
+        raise FileNotFoundError(f"Cover file {cover_path} not found.")
+    for payload_path in payload_paths:
+        if not os.path.exists(payload_path):
+            raise FileNotFoundError(f"Payload file {payload_path} not found.")
+    carrier, output_path = _stego_carrier(cover_path, output_path, mmap, kind, format)
+
+    trace.progress("Loading payload files...")
+    try:
+        with ExitStack() as stack:
+            entries = [(os.path.basename(path), stack.enter_context(open(path, 'rb'))) for path in payload_paths]
+            api.embed_entries(carrier, entries, key, output_path, compression, bits, alpha, low_byte, png, threads)
+    except Exception:
+        if getattr(carrier, 'mapped', False):
+            os.remove(output_path)
+        raise
+    trace.progress(f"Time taken: {int(time.time() - start)} seconds.")
+    return output_path
+
+
+def open_container_path(stego_path, key, threads=1, mmap=True, kind=None, format=None):
+    """The api.Container hidden in the file at `stego_path`; only its table of contents is read."""
+    if not os.path.exists(stego_path):
+        raise FileNotFoundError(f"Stego file {stego_path} not found.")
+    backend = detect_backend(stego_path, kind, format)
+    return api.open_container(open_carrier(stego_path, mmap=mmap, format=backend.name), key, threads)
+
+
+def extract_entries_path(stego_path, key, names=None, directory=None, threads=1, mmap=True, kind=None, format=None):
+    """
+    Write the named entries (default: all) of the container in the file at
+    `stego_path` to `directory`, each under its own file name. Entries that
+    are not asked for are never decoded. Returns the output paths.
+    """
+    start = time.time()
+    container = open_container_path(stego_path, key, threads, mmap, kind, format)
+    if names is None:
+        names = [entry.name for entry in container.entries]
+    for name in names:
+        find_entry(container.entries, name)  # fail before writing anything
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    output_paths = []
+    for name in names:
+        # Names come from the table of contents; never let one point outside the directory
+        filename = os.path.basename(name.replace('\\', '/'))
+        if filename in ('', '.', '..'):
+            filename = f"extracted_entry.{find_entry(container.entries, name).extension}"
+        output_path = os.path.join(directory or '', filename)
+        output_paths.append(save_extracted(container.chunks(name), output_path, None))
+    trace.progress(f"Time taken: {int(time.time() - start)} seconds.")
+    return output_paths
@@ -0,0 +1,69 @@
+import struct
+from collections import namedtuple
+
+### Markers used by the original (unversioned) formats
+START_MARKER = b'###START###'
+END_MARKER = b'###END###'
+
+### Versioned header: magic + version, then the fields below, all read before the payload
+MAGIC = b'###SBITS###'
+VERSION = 1
+PREFIX_FORMAT = '>11sB'
+PREFIX_SIZE = struct.calcsize(PREFIX_FORMAT)
+PREFIX_BITS = PREFIX_SIZE * 8
+
+# length (64-bit, so ciphertexts past 4 GiB fit), aead, log2(segment size), codec, slot set, bits per slot, content
+FIELD_FORMAT = '>QBBBBBB'
+HEADER_SIZE = PREFIX_SIZE + struct.calcsize(FIELD_FORMAT)
+MAX_LENGTH = (1 << 64) - 1  # largest ciphertext the length field records
+
+### What follows the header: one payload, or a table of contents and its entries (see container.py)
+CONTENT_PAYLOAD = 0
+CONTENT_CONTAINER = 1
+
+### The scrypt salt is not in the header: it has to be read before the key (and so the header
+### positions) exist, so it sits in fixed carrier slots no payload uses (see carrier.salt_layout)
+SALT_SIZE = 16
+SALT_BITS = SALT_SIZE * 8
+
+### Payload encryption layouts recorded in the header (see crypto/aes.py), and the sizes
+### capacity planning needs without loading pycryptodome
+AEAD_EAX = 0     # one-shot EAX: nonce + tag + ciphertext
+AEAD_STREAM = 1  # STREAM-style segments, each with its own nonce and tag
+
+SEGMENT_LOG = 16
+STREAM_PREFIX_SIZE = 11
+TAG_SIZE = 16
+
+Header = namedtuple('Header', ['version', 'length', 'aead', 'segment_log', 'codec', 'slots', 'bits', 'content', 'size'])
+
+
+def pack_header(length, aead=0, segment_log=0, codec=0, slots=0, bits=1, content=CONTENT_PAYLOAD):
+    fields = struct.pack(FIELD_FORMAT, length, aead, segment_log, codec, slots, bits, content)
+    return struct.pack(PREFIX_FORMAT, MAGIC, VERSION) + fields
+
+
+def parse_prefix(data):
+    ### Returns the header version, or None when the magic is missing
+    if len(data) < PREFIX_SIZE:
+        return None
+    magic, version = struct.unpack(PREFIX_FORMAT, data[:PREFIX_SIZE])
+    if magic != MAGIC:
+        return None
+    return version
+
+
+def parse_header(data):
+    version = parse_prefix(data)
+    if version is None:
+        raise ValueError("Header not found - file may not contain embedded data or key is incorrect")
+    if version != VERSION:
+        raise ValueError(f"Unsupported header version {version}")
+    if len(data) < HEADER_SIZE:
+        raise ValueError("Not enough data to read the header")
+    return Header(version, *struct.unpack(FIELD_FORMAT, data[PREFIX_SIZE:HEADER_SIZE]), HEADER_SIZE)
+
+
+def stream_ciphertext_size(length, segment_size=1 << SEGMENT_LOG):
+    segments = max(1, -(-length // segment_size))
+    return STREAM_PREFIX_SIZE + length + segments * TAG_SIZE
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+from .header import parse_header, parse_prefix, HEADER_SIZE, PREFIX_BITS, SALT_BITS
+
+
+def to_bits(data):
+    # One uint8 (0/1) per bit, MSB first - same order as format(byte, '08b')
+    return np.unpackbits(np.frombuffer(bytes(data), dtype=np.uint8))
+
+
+def embed_bits(buffer, positions, bits):
+    ### positions is an index array (bit plane 0) or an (indexes, planes) pair from a SlotLayout
+    if not isinstance(positions, tuple):
+        buffer[positions] = (buffer[positions] & 0xFE) | bits
+        return
+    indexes, planes = positions
+    # A slot can appear once per plane, so scatter one plane at a time
+    for plane in np.unique(planes):
+        selected = planes == plane
+        slots = indexes[selected]
+        buffer[slots] = (buffer[slots] & np.uint8(0xFF ^ (1 << int(plane)))) | (bits[selected] << np.uint8(plane))
+
+
+def _gather_bits(buffer, positions):
+    if isinstance(positions, tuple):
+        indexes, planes = positions
+        return (buffer[indexes] >> planes.astype(np.uint8)) & 1
+    return buffer[positions] & 1
+
+
+def _pack(bits):
+    # Pack 8 bits at a time, dropping any incomplete byte
+    usable = len(bits) - len(bits) % 8
+    return np.packbits(bits[:usable]).tobytes()
+
+
+def extract_bytes(buffer, positions):
+    return _pack(_gather_bits(buffer, positions))
+
+
+def read_header(buffer, positions):
+    ### Returns the parsed Header, or None when the header magic is not at these positions
+    if positions.n < PREFIX_BITS:
+        return None
+    if parse_prefix(extract_bytes(buffer, positions.take(0, PREFIX_BITS))) is None:
+        return None
+    header_bits = HEADER_SIZE * 8
+    if header_bits > positions.n:
+        raise ValueError("Not enough data to read the header")
+    return parse_header(extract_bytes(buffer, positions.take(0, header_bits)))
+
+
+def read_salt(buffer, layout):
+    return extract_bytes(buffer, layout.locate(np.arange(SALT_BITS)))
+
+
+def write_salt(buffer, layout, salt):
+    embed_bits(buffer, layout.locate(np.arange(SALT_BITS)), to_bits(salt))
+
+
+### Below this many bits per thread, splitting a chunk costs more than it saves
+MIN_SLICE_BITS = 1 << 15
+
+
+@contextmanager
+def _thread_pool(threads):
+    if threads is None or threads <= 1:
+        yield None
+        return
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        yield pool
+
+
+def _slices(count, parts):
+    step = max(MIN_SLICE_BITS, -(-count // parts))
+    return [(start, min(step, count - start)) for start in range(0, count, step)]
+
+
+def _subset(positions, selected):
+    if isinstance(positions, tuple):
+        return positions[0][selected], positions[1][selected]
+    return positions[selected]
+
+
+def _embed_tiled(pool, tiles, buffer, positions, offset, bits):
+    ### Compute positions slice by slice in parallel, then let each tile (a contiguous band of
+    ### the buffer: image rows / audio frames) apply its own writes, so no byte is shared
+    tile_size = -(-len(buffer) // tiles)
+
+    def locate(piece):
+        start, count = piece
+        where = positions.take(offset + start, count)
+        tile = (where[0] if isinstance(where, tuple) else where) // tile_size
+        order = np.argsort(tile, kind='stable')
+        bounds = np.searchsorted(tile[order], np.arange(tiles + 1))
+        return start, where, order, bounds
+
+    located = list(pool.map(locate, _slices(len(bits), tiles)))
+
+    def write(tile):
+        for start, where, order, bounds in located:
+            selected = order[bounds[tile]:bounds[tile + 1]]
+            if len(selected):
+                embed_bits(buffer, _subset(where, selected), bits[start + selected])
+
+    list(pool.map(write, range(tiles)))
+
+
+def embed_stream(buffer, positions, start_bit, chunks, threads=1):
+    ### Embed byte chunks back to back; only one chunk's bits exist at a time
+    offset = start_bit
+    with _thread_pool(threads) as pool:
+        for chunk in chunks:
+            bits = to_bits(chunk)
+            if pool is not None and len(bits) >= 2 * MIN_SLICE_BITS:
+                _embed_tiled(pool, threads, buffer, positions, offset, bits)
+            else:
+                embed_bits(buffer, positions.take(offset, len(bits)), bits)
+            offset += len(bits)
+    return offset
+
+
+def extract_stream(buffer, positions, start_bit, nbytes, chunk_size, threads=1):
+    offset = start_bit
+    end = start_bit + nbytes * 8
+
+    def gather(piece):
+        start, count = piece
+        return _gather_bits(buffer, positions.take(start, count))
+
+    with _thread_pool(threads) as pool:
+        while offset < end:
+            count = min(chunk_size * 8, end - offset)
+            if pool is not None and count >= 2 * MIN_SLICE_BITS:
+                pieces = [(offset + start, size) for start, size in _slices(count, threads)]
+                yield _pack(np.concatenate(list(pool.map(gather, pieces))))
+            else:
+                yield extract_bytes(buffer, positions.take(offset, count))
+            offset += count
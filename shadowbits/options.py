@@ -0,0 +1,23 @@
+"""
+Names and limits offered as command-line choices. Nothing here imports
+numpy, Pillow or pycryptodome, so the CLI can build its parser (and answer
+--help) before loading any of them. The modules that implement these
+import them from here.
+"""
+
+### Position selection schemes
+KEYED = 'keyed'    # lazy keyed permutation, cost scales with payload bits
+LEGACY = 'legacy'  # original random.shuffle over the whole carrier
+SCHEMES = (KEYED, LEGACY)
+
+### Most low bits used in each carrier byte
+MAX_BITS = 4
+
+### PNG output presets for Pillow's encoder, and the zlib strategies that can override them
+PNG_MODES = {
+    'default': {},                   # Pillow's default, zlib level 6
+    'fast': {'compress_level': 1},   # throughput over size
+    'optimize': {'optimize': True},  # smallest output, slowest
+    'store': {'compress_level': 0},  # no compression at all
+}
+PNG_STRATEGIES = {'default': 0, 'filtered': 1, 'huffman': 2, 'rle': 3, 'fixed': 4}
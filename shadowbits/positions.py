@@ -0,0 +1,152 @@
+import hashlib
+import random
+import numpy as np
+from .options import KEYED, LEGACY, MAX_BITS
+
+### Slot sets recorded in the payload header
+SLOTS_DEFAULT = 0   # RGB channels / every audio byte
+SLOTS_ALPHA = 1     # RGBA channels
+SLOTS_LOW_BYTE = 2  # low byte of each audio sample
+
+ROUNDS = 8
+_ROUND_TAG = b'shadowbits-keyed-v1'
+_MUL1 = np.uint64(0x9E3779B97F4A7C15)
+_MUL2 = np.uint64(0xBF58476D1CE4E5B9)
+
+
+class KeyedPermutation:
+    """
+    Keyed permutation of [0, n) evaluated only for the indexes asked for.
+    A balanced Feistel network over the smallest even bit width covering n,
+    with cycle-walking to stay inside [0, n). take(start, count) returns the
+    positions for bits start..start+count-1, all distinct.
+    """
+
+    def __init__(self, n, seed):
+        if n <= 0:
+            raise ValueError("Cannot select positions in an empty carrier")
+        self.n = n
+        self.half = max(1, ((n - 1).bit_length() + 1) // 2)
+        self.mask = np.uint64((1 << self.half) - 1)
+        seed_bytes = seed.to_bytes(32, 'big')
+        self.keys = [
+            np.uint64(int.from_bytes(hashlib.sha256(_ROUND_TAG + seed_bytes + bytes([i])).digest()[:8], 'big'))
+            for i in range(ROUNDS)
+        ]
+
+    def _round(self, right, key):
+        x = (right ^ key) * _MUL1
+        x ^= x >> np.uint64(29)
+        x *= _MUL2
+        x ^= x >> np.uint64(32)
+        return x & self.mask
+
+    def _feistel(self, x):
+        shift = np.uint64(self.half)
+        left = x >> shift
+        right = x & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << shift) | right
+
+    def take(self, start, count):
+        if start < 0 or start + count > self.n:
+            raise ValueError("Requested positions exceed carrier capacity")
+        out = self._feistel(np.arange(start, start + count, dtype=np.uint64))
+        ### Cycle-walk the few values that land outside [0, n)
+        outside = np.flatnonzero(out >= self.n)
+        while outside.size:
+            out[outside] = self._feistel(out[outside])
+            outside = outside[out[outside] >= self.n]
+        return out.astype(np.int64)
+
+
+class ShufflePermutation:
+    """
+    The original ordering: random.shuffle over every unit of the carrier,
+    where a unit is `group` consecutive buffer slots (3 for RGB pixels).
+    Kept so files embedded before the keyed scheme still extract.
+    """
+
+    def __init__(self, n, seed, group=1):
+        self.n = n
+        self.group = group
+        prng = random.Random(seed)
+        self.indexes = list(range(n // group))
+        prng.shuffle(self.indexes)
+
+    def take(self, start, count):
+        if start < 0 or start + count > self.n:
+            raise ValueError("Requested positions exceed carrier capacity")
+        first = start // self.group
+        last = -(-(start + count) // self.group)
+        units = np.asarray(self.indexes[first:last], dtype=np.int64)
+        positions = (units[:, None] * self.group + np.arange(self.group, dtype=np.int64)).reshape(-1)
+        offset = start - first * self.group
+        return positions[offset:offset + count]
+
+
+def get_permutation(scheme, n, seed, group=1):
+    if scheme == KEYED:
+        return KeyedPermutation(n, seed)
+    if scheme == LEGACY:
+        return ShufflePermutation(n, seed, group)
+    raise ValueError(f"Unknown position scheme {scheme}")
+
+
+class SlotLayout:
+    """
+    Which buffer bytes carry payload bits, and how many low bits of each.
+    Slot s is buffer byte (s // width) * stride + s % width + offset. Bit address a
+    is bit plane a // slots of slot a % slots, so every plane-0 bit is used
+    before any plane-1 bit and with bits=1 the addresses are just the slots.
+    """
+
+    def __init__(self, buffer_size, kind=SLOTS_DEFAULT, bits=1, width=1, stride=1, offset=0):
+        if not 1 <= bits <= MAX_BITS:
+            raise ValueError(f"Bits per slot must be between 1 and {MAX_BITS}")
+        self.kind = kind
+        self.bits = bits
+        self.width = width
+        self.stride = stride
+        self.offset = offset
+        self.slots = (buffer_size // stride) * width
+        self.n = self.slots * bits
+
+    @property
+    def is_default(self):
+        return self.kind == SLOTS_DEFAULT and self.bits == 1
+
+    def locate(self, addresses):
+        ### Buffer indexes, or (indexes, planes) once more than one bit per slot is used
+        slots = addresses % self.slots if self.bits > 1 else addresses
+        if self.width != self.stride:
+            slots = (slots // self.width) * self.stride + slots % self.width
+        if self.offset:
+            slots = slots + self.offset
+        if self.bits == 1:
+            return slots
+        return slots, addresses // self.slots
+
+    def positions(self, scheme, seed):
+        if not self.is_default:
+            if scheme != KEYED:
+                raise ValueError("Only the keyed scheme supports multi-bit and alpha/low-byte layouts")
+            # Keep each layout's ordering independent of the default one
+            seed = int.from_bytes(hashlib.sha256(seed.to_bytes(32, 'big') + bytes([self.kind, self.bits])).digest(), 'big')
+        permutation = get_permutation(scheme, self.n, seed, self.width)
+        if self.width == self.stride and self.bits == 1 and not self.offset:
+            return permutation
+        return LayoutPositions(self, permutation)
+
+
+class LayoutPositions:
+    """A permutation of bit addresses, handed out as buffer positions of a SlotLayout."""
+
+    def __init__(self, layout, permutation):
+        self.layout = layout
+        self.permutation = permutation
+        self.n = permutation.n
+
+    def take(self, start, count):
+        return self.layout.locate(self.permutation.take(start, count))
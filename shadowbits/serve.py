@@ -0,0 +1,205 @@
+"""
+A long-running worker speaking JSON-RPC 2.0, one request per line, on
+stdin/stdout or on a local Unix socket. Libraries are loaded once at start
+and key contexts are kept between requests, so each call only pays for
+its own embedding or extraction:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "embed",
+     "params": {"cover": "in.png", "payload": "secret.txt", "key": "k", "output": "out.png"}}
+
+Methods: embed, extract, capacity, ping and shutdown. embed and extract
+take the arguments of engine.embed_path / extract_path by name (cover,
+payload, key, output, scheme, compression, bits, alpha, low_byte, png,
+threads, mmap, format; stego, key, output, ...) and return the output path.
+For containers, embed_entries takes a list of payloads, list returns the
+table of contents and extract_entries takes the names to write (default
+all) and a directory.
+"""
+import json
+import os
+import socketserver
+import stat
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager
+from . import trace
+from .capacity import image_capacity, audio_capacity
+from .carrier import PngOptions
+from .crypto.aes import KeyContext, KEY_CACHE_SIZE
+from .engine import embed_path, extract_path, embed_entries_path, open_container_path, extract_entries_path
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+
+class KeyCache:
+    """
+    Embedding contexts per password, least recently used dropped first.
+    Reusing one skips scrypt on every embed with the same key. Each
+    payload still gets fresh STREAM nonces, but payloads embedded with one
+    cached context share its salt.
+    """
+
+    def __init__(self, size=KEY_CACHE_SIZE):
+        self.size = size
+        self._contexts = OrderedDict()
+
+    def find(self, password):
+        ### The cached context, or the password itself when there is none
+        return self._contexts.get(password, password)
+
+    def get(self, password):
+        context = self._contexts.pop(password, None)
+        if context is None:
+            with trace.stage('derive_key'):
+                context = KeyContext.new(password)
+        self._contexts[password] = context
+        while len(self._contexts) > self.size:
+            self._contexts.popitem(last=False)
+        return context
+
+
+class Server:
+    def __init__(self, keys=None):
+        self.keys = keys or KeyCache()
+        self.running = True
+        self.methods = {
+            'embed': self.embed,
+            'extract': self.extract,
+            'embed_entries': self.embed_entries,
+            'list': self.list,
+            'extract_entries': self.extract_entries,
+            'capacity': self.capacity,
+            'ping': lambda: 'pong',
+            'shutdown': self.shutdown,
+        }
+
+    def embed(self, cover, payload, key, output=None, png=None, **options):
+        if png is not None:
+            png = PngOptions(**png)
+        # The renamed path arguments are the only ones that differ from embed_path
+        return embed_path(cover, payload, self.keys.get(key), output_path=output, png=png, **options)
+
+    def extract(self, stego, key, output=None, **options):
+        ### A payload embedded here reuses the cached context; crypto.aes caches the contexts of other salts
+        return extract_path(stego, self.keys.find(key), output_path=output, **options)
+
+    def embed_entries(self, cover, payloads, key, output=None, png=None, **options):
+        if png is not None:
+            png = PngOptions(**png)
+        return embed_entries_path(cover, payloads, self.keys.get(key), output_path=output, png=png, **options)
+
+    def list(self, stego, key, **options):
+        return [entry._asdict() for entry in open_container_path(stego, self.keys.find(key), **options).entries]
+
+    def extract_entries(self, stego, key, **options):
+        return extract_entries_path(stego, self.keys.find(key), **options)
+
+    def capacity(self, cover, kind='img', format=None):
+        return (image_capacity if kind == 'img' else audio_capacity)(cover, format)
+
+    def shutdown(self):
+        ### Answered like any other call; the server stops once the response is sent
+        self.running = False
+
+    def handle(self, request):
+        ### The response dict for one request, or None for a notification
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or not isinstance(request.get('method'), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+        request_id = request.get('id')
+        method = self.methods.get(request['method'])
+        params = request.get('params', {})
+        if method is None:
+            response = _error(request_id, METHOD_NOT_FOUND, f"Unknown method {request['method']}")
+        elif not isinstance(params, (dict, list)):
+            response = _error(request_id, INVALID_PARAMS, "params must be an object or array")
+        else:
+            try:
+                result = method(**params) if isinstance(params, dict) else method(*params)
+                response = {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+            except TypeError as e:
+                response = _error(request_id, INVALID_PARAMS, str(e))
+            except Exception as e:
+                response = _error(request_id, SERVER_ERROR, str(e), type(e).__name__)
+        return response if 'id' in request else None
+
+    def handle_line(self, line):
+        ### The response line for one line of input, or None when there is nothing to send
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return json.dumps(_error(None, PARSE_ERROR, str(e)))
+        if isinstance(request, list):
+            if not request:
+                return json.dumps(_error(None, INVALID_REQUEST, "Empty batch"))
+            responses = [response for response in map(self.handle, request) if response is not None]
+            return json.dumps(responses) if responses else None
+        response = self.handle(request)
+        return json.dumps(response) if response is not None else None
+
+    def serve_stream(self, infile, outfile):
+        for line in infile:
+            if not line.strip():
+                continue
+            response = self.handle_line(line)
+            if response is not None:
+                outfile.write(response + '\n')
+                outfile.flush()
+            if not self.running:
+                return
+
+
+def _error(request_id, code, message, data=None):
+    error = {'code': code, 'message': message}
+    if data is not None:
+        error['data'] = data
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': error}
+
+
+@contextmanager
+def _quiet():
+    ### Progress lines would land in the response stream; the current tracer's events still go out
+    current = trace.get_tracer()
+    with trace.use_tracer(trace.Tracer(current.callback, progress=False, memory=current.memory)):
+        yield
+
+
+def serve_stdio(server=None):
+    with _quiet():
+        (server or Server()).serve_stream(sys.stdin, sys.stdout)
+
+
+def serve_socket(path, server=None):
+    """Serve connections on a Unix socket at `path`, one at a time, until a shutdown request."""
+    server = server or Server()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                response = server.handle_line(line.decode())
+                if response is not None:
+                    self.wfile.write(response.encode() + b'\n')
+                if not server.running:
+                    return
+
+    if os.path.exists(path):
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            raise FileExistsError(f"{path} exists and is not a socket")
+        os.remove(path)  # left behind by a server that didn't shut down cleanly
+    # The socket takes keys, so only its owner may connect
+    umask = os.umask(0o177)
+    try:
+        listener = socketserver.UnixStreamServer(path, Handler)
+    finally:
+        os.umask(umask)
+    with listener, _quiet():
+        try:
+            while server.running:
+                listener.handle_request()
+        finally:
+            os.remove(path)
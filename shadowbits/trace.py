@@ -0,0 +1,129 @@
+"""
+Progress messages and per-stage instrumentation.
+
+Pipeline code reports through progress() and stage() instead of print. The
+active Tracer decides what happens: the default prints the progress lines
+as before, Tracer(progress=False) is silent, and a callback receives every
+event as a dict (json_lines() writes them as JSON lines). Stage events carry
+wall time, bytes processed and, with memory=True, the peak traced
+allocation above the stage's starting point.
+"""
+import functools
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Tracer:
+    """Receives progress messages and stage events."""
+
+    def __init__(self, callback=None, progress=True, memory=False):
+        self.callback = callback
+        self.show_progress = progress
+        self.memory = memory
+        self._stack = []
+
+    def emit(self, event):
+        if self.callback is not None:
+            self.callback(event)
+
+    def progress(self, message):
+        if self.show_progress:
+            print(message)
+        self.emit({'event': 'progress', 'message': message})
+
+    @contextmanager
+    def stage(self, name, message=None, nbytes=None):
+        if message:
+            self.progress(message)
+        record = {'bytes': nbytes}
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracing = self.memory and tracemalloc.is_tracing()
+        if tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # The parent's peak so far would be lost by the reset below
+                self._stack[-1]['max_peak'] = max(self._stack[-1]['max_peak'], peak)
+            _reset_peak()
+            frame = {'name': name, 'start_memory': current, 'max_peak': current}
+        else:
+            frame = {'name': name}
+        self._stack.append(frame)
+        path = '/'.join(f['name'] for f in self._stack)
+
+        start = time.perf_counter()
+        ok = False
+        try:
+            yield record
+            ok = True
+        finally:
+            seconds = time.perf_counter() - start
+            self._stack.pop()
+            event = {'event': 'stage', 'name': name, 'path': path, 'seconds': round(seconds, 6),
+                     'bytes': record['bytes'], 'ok': ok}
+            if tracing:
+                peak = max(frame['max_peak'], tracemalloc.get_traced_memory()[1])
+                event['peak_alloc'] = peak - frame['start_memory']
+                if self._stack and 'max_peak' in self._stack[-1]:
+                    self._stack[-1]['max_peak'] = max(self._stack[-1]['max_peak'], peak)
+            self.emit(event)
+
+
+def _reset_peak():
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    # Before Python 3.9 the peak can't be reset, so stages report the running peak
+
+
+def json_lines(stream=None):
+    """A callback that writes each event to `stream` (default stderr) as one JSON line."""
+    def write(event):
+        out = stream if stream is not None else sys.stderr
+        out.write(json.dumps(event) + '\n')
+        out.flush()
+    return write
+
+
+_tracer = Tracer()
+
+
+def get_tracer():
+    return _tracer
+
+
+def set_tracer(tracer):
+    ### Install `tracer` for the whole process and return the previous one
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+@contextmanager
+def use_tracer(tracer):
+    previous = set_tracer(tracer)
+    try:
+        yield tracer
+    finally:
+        set_tracer(previous)
+
+
+def progress(message):
+    _tracer.progress(message)
+
+
+def stage(name, message=None, nbytes=None):
+    return _tracer.stage(name, message, nbytes)
+
+
+def traced(name):
+    """Decorator running the whole function as one stage."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
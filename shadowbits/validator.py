@@ -1,3 +1,173 @@
+import os
+from collections import namedtuple
+
+### A signature matches when every (offset, magic) part is found in the data; when several
+### match, the one with the most magic bytes wins, so 'BM' or a bare frame sync never
+### shadows a longer signature
+Signature = namedtuple('Signature', ['parts', 'extension', 'mime', 'length'])
+
+_SIGNATURES = [
+    # Images
+    (((0, b'\xFF\xD8\xFF'),), 'jpg', 'image/jpeg'),
+    (((0, b'\x89PNG\r\n\x1a\n'),), 'png', 'image/png'),
+    (((0, b'GIF87a'),), 'gif', 'image/gif'),
+    (((0, b'GIF89a'),), 'gif', 'image/gif'),
+    (((0, b'BM'), (6, b'\x00\x00\x00\x00')), 'bmp', 'image/bmp'),
+    (((0, b'RIFF'), (8, b'WEBP')), 'webp', 'image/webp'),
+    (((0, b'\x00\x00\x01\x00'),), 'ico', 'image/x-icon'),
+    (((0, b'\x00\x00\x02\x00'),), 'cur', 'image/x-icon'),
+    (((0, b'II*\x00'),), 'tif', 'image/tiff'),
+    (((0, b'MM\x00*'),), 'tif', 'image/tiff'),
+    (((0, b'8BPS'),), 'psd', 'image/vnd.adobe.photoshop'),
+    (((0, b'\x00\x00\x00\x0CjP  \r\n\x87\n'),), 'jp2', 'image/jp2'),
+    (((0, b'\xFF\x0A'),), 'jxl', 'image/jxl'),
+    (((0, b'\x00\x00\x00\x0CJXL \r\n\x87\n'),), 'jxl', 'image/jxl'),
+    (((4, b'ftypheic'),), 'heic', 'image/heic'),
+    (((4, b'ftypheix'),), 'heic', 'image/heic'),
+    (((4, b'ftypmif1'),), 'heic', 'image/heif'),
+    (((4, b'ftypavif'),), 'avif', 'image/avif'),
+    (((0, b'<svg'),), 'svg', 'image/svg+xml'),
+
+    # Documents
+    (((0, b'%PDF'),), 'pdf', 'application/pdf'),
+    (((0, b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1'),), 'doc', 'application/msword'),
+    (((0, b'PK\x03\x04'),), 'zip', 'application/zip'),  # Also docx, xlsx, etc.
+    (((0, b'PK\x03\x04'), (30, b'mimetypeapplication/epub+zip')), 'epub', 'application/epub+zip'),
+    (((0, b'PK\x03\x04'), (30, b'mimetypeapplication/vnd.oasis.opendocument.text')), 'odt', 'application/vnd.oasis.opendocument.text'),
+    (((0, b'PK\x03\x04'), (30, b'mimetypeapplication/vnd.oasis.opendocument.spreadsheet')), 'ods', 'application/vnd.oasis.opendocument.spreadsheet'),
+    (((0, b'{\\rtf1'),), 'rtf', 'application/rtf'),
+    (((0, b'%!PS'),), 'ps', 'application/postscript'),
+    (((0, b'SQLite format 3\x00'),), 'sqlite', 'application/vnd.sqlite3'),
+
+    # Audio
+    (((0, b'ID3'),), 'mp3', 'audio/mpeg'),
+    (((0, b'\xFF\xFB'),), 'mp3', 'audio/mpeg'),
+    (((0, b'\xFF\xF3'),), 'mp3', 'audio/mpeg'),
+    (((0, b'\xFF\xF2'),), 'mp3', 'audio/mpeg'),
+    (((0, b'\xFF\xF1'),), 'aac', 'audio/aac'),
+    (((0, b'\xFF\xF9'),), 'aac', 'audio/aac'),
+    (((0, b'OggS'),), 'ogg', 'audio/ogg'),
+    (((0, b'OggS'), (28, b'OpusHead')), 'opus', 'audio/opus'),
+    (((0, b'fLaC'),), 'flac', 'audio/flac'),
+    (((0, b'RIFF'), (8, b'WAVE')), 'wav', 'audio/wav'),
+    (((0, b'FORM'), (8, b'AIFF')), 'aiff', 'audio/aiff'),
+    (((0, b'FORM'), (8, b'AIFC')), 'aifc', 'audio/aiff'),
+    (((0, b'MThd'),), 'mid', 'audio/midi'),
+    (((4, b'ftypM4A '),), 'm4a', 'audio/mp4'),
+
+    # Video
+    (((4, b'ftyp'),), 'mp4', 'video/mp4'),
+    (((4, b'ftypM4V'),), 'm4v', 'video/x-m4v'),
+    (((4, b'ftypqt  '),), 'mov', 'video/quicktime'),
+    (((4, b'ftyp3gp'),), '3gp', 'video/3gpp'),
+    (((0, b'RIFF'), (8, b'AVI ')), 'avi', 'video/x-msvideo'),
+    (((0, b'\x1A\x45\xDF\xA3'),), 'mkv', 'video/x-matroska'),
+    (((0, b'FLV\x01'),), 'flv', 'video/x-flv'),
+    (((0, b'\x30\x26\xB2\x75\x8E\x66\xCF\x11'),), 'wmv', 'video/x-ms-wmv'),
+    (((0, b'\x00\x00\x01\xBA'),), 'mpg', 'video/mpeg'),
+
+    # Archives
+    (((0, b'\x50\x4B\x05\x06'),), 'zip', 'application/zip'),
+    (((0, b'\x50\x4B\x07\x08'),), 'zip', 'application/zip'),
+    (((0, b'\x1F\x8B\x08'),), 'gz', 'application/gzip'),
+    (((0, b'BZh'),), 'bz2', 'application/x-bzip2'),
+    (((0, b'\xFD7zXZ\x00'),), 'xz', 'application/x-xz'),
+    (((0, b'\x28\xB5\x2F\xFD'),), 'zst', 'application/zstd'),
+    (((0, b'\x04\x22\x4D\x18'),), 'lz4', 'application/x-lz4'),
+    (((0, b'Rar!\x1A\x07\x00'),), 'rar', 'application/x-rar-compressed'),
+    (((0, b'Rar!\x1A\x07\x01\x00'),), 'rar', 'application/x-rar-compressed'),
+    (((0, b'7z\xBC\xAF\x27\x1C'),), '7z', 'application/x-7z-compressed'),
+    (((257, b'ustar'),), 'tar', 'application/x-tar'),
+    (((0, b'MSCF'),), 'cab', 'application/vnd.ms-cab-compressed'),
+    (((0, b'!<arch>\ndebian'),), 'deb', 'application/vnd.debian.binary-package'),
+    (((0, b'\xED\xAB\xEE\xDB'),), 'rpm', 'application/x-rpm'),
+    (((32769, b'CD001'),), 'iso', 'application/x-iso9660-image'),
+
+    # Executables and fonts
+    (((0, b'\x7FELF'),), 'elf', 'application/x-executable'),
+    (((0, b'MZ'),), 'exe', 'application/vnd.microsoft.portable-executable'),
+    (((0, b'\x00asm'),), 'wasm', 'application/wasm'),
+    (((0, b'\xCA\xFE\xBA\xBE'),), 'class', 'application/java-vm'),
+    (((0, b'wOFF'),), 'woff', 'font/woff'),
+    (((0, b'wOF2'),), 'woff2', 'font/woff2'),
+    (((0, b'OTTO'),), 'otf', 'font/otf'),
+    (((0, b'\x00\x01\x00\x00\x00'),), 'ttf', 'font/ttf'),
+
+    # Keys and certificates
+    (((0, b'-----BEGIN '),), 'pem', 'application/x-pem-file'),
+    (((0, b'-----BEGIN PGP'),), 'asc', 'application/pgp-keys'),
+
+    # Text/Code
+    (((0, b'#!/bin/bash'),), 'sh', 'text/x-shellscript'),
+    (((0, b'#!/bin/sh'),), 'sh', 'text/x-shellscript'),
+    (((0, b'#!/usr/bin/env bash'),), 'sh', 'text/x-shellscript'),
+    (((0, b'#!/usr/bin/env python'),), 'py', 'text/x-python'),
+    (((0, b'#!/usr/bin/python'),), 'py', 'text/x-python'),
+    (((0, b'#!/usr/bin/env node'),), 'js', 'text/javascript'),
+    (((0, b'<?xml'),), 'xml', 'text/xml'),
+    (((0, b'<html'),), 'html', 'text/html'),
+    (((0, b'<!DOCTYPE html'),), 'html', 'text/html'),
+    (((0, b'<!doctype html'),), 'html', 'text/html'),
+]
+
+
+def _build_index(signatures):
+    ### offset of the first part -> its first byte -> signatures, longest first
+    index = {}
+    for parts, extension, mime in signatures:
+        signature = Signature(parts, extension, mime, sum(len(magic) for offset, magic in parts))
+        offset, magic = parts[0]
+        index.setdefault(offset, {}).setdefault(magic[0], []).append(signature)
+    for table in index.values():
+        for candidates in table.values():
+            candidates.sort(key=lambda signature: -signature.length)
+    return index
+
+
+_INDEX = _build_index(_SIGNATURES)
+
+### Bytes needed to test every signature, and to classify text
+SNIFF_SIZE = max(max(offset + len(magic) for offset, magic in parts) for parts, _, _ in _SIGNATURES)
+TEXT_SAMPLE = 512
+
+### Printable ASCII plus the characters str.isspace() accepts
+_TEXT_BYTES = bytes(range(0x20, 0x7F)) + b'\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f'
+
+
+def _match(data):
+    best = None
+    for offset, table in _INDEX.items():
+        if len(data) <= offset:
+            continue
+        for signature in table.get(data[offset], ()):
+            if best is not None and signature.length <= best.length:
+                break
+            if all(data.startswith(magic, at) for at, magic in signature.parts):
+                best = signature
+                break
+    return best
+
+
+def _text_type(data):
+    text = data[:TEXT_SAMPLE]
+    if text.translate(None, _TEXT_BYTES):
+        return None
+    # Further classify text files
+    text_lower = text.lower()
+    if any(keyword in text_lower for keyword in [b'<html', b'<!doctype', b'<head', b'<body']):
+        return 'html', 'text/html'
+    elif text.strip().startswith(b'<?xml'):
+        return 'xml', 'text/xml'
+    elif any(keyword in text_lower for keyword in [b'import ', b'def ', b'class ', b'if __name__']):
+        return 'py', 'text/x-python'
+    elif any(keyword in text_lower for keyword in [b'#include', b'int main', b'void ']):
+        return 'c', 'text/x-c'
+    elif any(keyword in text_lower for keyword in [b'function', b'var ', b'let ', b'const ']):
+        return 'js', 'text/javascript'
+    else:
+        return 'txt', 'text/plain'
+
+
 def detect_file_type(data):
     """
     Detect file type based on magic bytes (file signatures)
@@ -5,83 +175,46 @@ def detect_file_type(data):
     """
     if not data or len(data) < 4:
         return 'bin', 'application/octet-stream'
-    
-    # Common file signatures
-    signatures = {
-        # Images
-        b'\xFF\xD8\xFF': ('jpg', 'image/jpeg'),
-        b'\x89PNG\r\n\x1a\n': ('png', 'image/png'),
-        b'GIF87a': ('gif', 'image/gif'),
-        b'GIF89a': ('gif', 'image/gif'),
-        b'BM': ('bmp', 'image/bmp'),
-        b'RIFF': ('webp', 'image/webp'),
-        b'\x00\x00\x01\x00': ('ico', 'image/x-icon'),
-        
-        # Documents
-        b'%PDF': ('pdf', 'application/pdf'),
-        b'\xD0\xCF\x11\xE0\xA1\xB1\x1A\xE1': ('doc', 'application/msword'),
-        b'PK\x03\x04': ('zip', 'application/zip'),  # Also docx, xlsx, etc.
-        
-        # Audio
-        b'ID3': ('mp3', 'audio/mpeg'),
-        b'\xFF\xFB': ('mp3', 'audio/mpeg'),
-        b'\xFF\xF3': ('mp3', 'audio/mpeg'),
-        b'\xFF\xF2': ('mp3', 'audio/mpeg'),
-        b'OggS': ('ogg', 'audio/ogg'),
-        b'fLaC': ('flac', 'audio/flac'),
-        
-        # Video
-        b'\x00\x00\x00\x18ftypmp4': ('mp4', 'video/mp4'),
-        b'\x00\x00\x00\x20ftypM4V': ('m4v', 'video/x-m4v'),
-        b'RIFF....AVI ': ('avi', 'video/x-msvideo'),
-        
-        # Archives
-        b'\x50\x4B\x05\x06': ('zip', 'application/zip'),
-        b'\x50\x4B\x07\x08': ('zip', 'application/zip'),
-        b'\x1F\x8B\x08': ('gz', 'application/gzip'),
-        b'Rar!\x1A\x07\x00': ('rar', 'application/x-rar-compressed'),
-        b'7z\xBC\xAF\x27\x1C': ('7z', 'application/x-7z-compressed'),
-        
-        # Text/Code
-        b'#!/bin/bash': ('sh', 'text/x-shellscript'),
-        b'#!/bin/sh': ('sh', 'text/x-shellscript'),
-        b'<?xml': ('xml', 'text/xml'),
-        b'<html': ('html', 'text/html'),
-        b'<!DOCTYPE html': ('html', 'text/html'),
-    }
-    
-    for sig, (ext, mime) in signatures.items():
-        if data.startswith(sig):
-            # Special handling for RIFF files
-            if sig == b'RIFF' and len(data) >= 12:
-                if data[8:12] == b'WAVE':
-                    return 'wav', 'audio/wav'
-                elif data[8:12] == b'WEBP':
-                    return 'webp', 'image/webp'
-                elif data[8:12] == b'AVI ':
-                    return 'avi', 'video/x-msvideo'
-            return ext, mime
-    
+    if not isinstance(data, bytes):
+        data = bytes(data[:SNIFF_SIZE])
+
+    signature = _match(data)
+    if signature is not None:
+        return signature.extension, signature.mime
+
     # Check for text files
-    try:
-        text = data[:min(512, len(data))].decode('utf-8', errors='strict')
-        if all(ord(c) < 127 and (c.isprintable() or c.isspace()) for c in text):
-            # Further classify text files
-            text_lower = text.lower()
-            if any(keyword in text_lower for keyword in ['<html', '<!doctype', '<head', '<body']):
-                return 'html', 'text/html'
-            elif text.strip().startswith('<?xml'):
-                return 'xml', 'text/xml'
-            elif any(keyword in text_lower for keyword in ['import ', 'def ', 'class ', 'if __name__']):
-                return 'py', 'text/x-python'
-            elif any(keyword in text_lower for keyword in ['#include', 'int main', 'void ']):
-                return 'c', 'text/x-c'
-            elif any(keyword in text_lower for keyword in ['function', 'var ', 'let ', 'const ']):
-                return 'js', 'text/javascript'
-            else:
-                return 'txt', 'text/plain'
-    except UnicodeDecodeError:
-        pass
-    
+    file_type = _text_type(data)
+    if file_type is not None:
+        return file_type
+
     # If no signature matches, return binary
-    return 'bin', 'application/octet-stream'
\ No newline at end of file
+    return 'bin', 'application/octet-stream'
+
+
+def _head(source):
+    ### First SNIFF_SIZE bytes of a path or of bytes-like data
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read(SNIFF_SIZE)
+    return source
+
+
+def detect_file_types(sources):
+    """
+    Classify many payloads in one call. Each source is bytes-like or a
+    path, of which only the first SNIFF_SIZE bytes are read.
+    Returns a list of (extension, mime_type) in the same order.
+    """
+    return [detect_file_type(_head(source)) for source in sources]
+
+
+def detect_directory(directory, recursive=False):
+    """
+    Classify every file in `directory` (and its subdirectories when
+    `recursive`). Returns a dict of path -> (extension, mime_type).
+    """
+    if recursive:
+        paths = [os.path.join(root, name) for root, dirs, names in os.walk(directory) for name in sorted(names)]
+    else:
+        paths = sorted(entry.path for entry in os.scandir(directory) if entry.is_file())
+    return dict(zip(paths, detect_file_types(paths)))
\ No newline at end of file